@@ -13,16 +13,98 @@ Author: EvolutionHumans
 License: MIT
 """
 
-import sys
 import os
-
-# 添加项目路径
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import sys
 
 __version__ = "1.0.0"
 __author__ = "EvolutionHumans"
 
 
+def _warmup_provider(ai_provider: str):
+    """预先导入 AI 提供商的 SDK（在后台线程中执行）"""
+    from src.ai_providers.provider_factory import AIProviderFactory
+    AIProviderFactory.warmup(ai_provider)
+
+
+def _create_client(args, config):
+    """创建 AI 客户端"""
+    from src.client.arixa_client import ArixaClient
+    
+    # 确定使用的 AI 提供商
+    ai_provider = args.ai or config.get("ai.default_provider", "claude")
+    model = args.model
+    
+    return ArixaClient(config, ai_provider=ai_provider, model=model)
+
+
+def _run_setup(args, config):
+    """首次配置"""
+    from src.client.setup_wizard import SetupWizard
+    wizard = SetupWizard(config)
+    wizard.run()
+
+
+def _list_tools(args, config):
+    """列出工具"""
+    from src.mcp_server.server import MCPServer
+    server = MCPServer(config)
+    tools = server.get_tools_schema()
+    print("\n📋 可用工具列表:\n" + "="*50)
+    for tool in tools:
+        print(f"\n🔧 {tool['name']}")
+        print(f"   描述: {tool['description']}")
+        print(f"   分类: {tool['category']}")
+
+
+def _run_server(args, config):
+    """启动 MCP 服务器（不需要 AI 客户端）"""
+    from src.mcp_server.server import MCPServer
+    server = MCPServer(config)
+    server.start()
+
+
+def _run_gui(args, config):
+    """启动图形界面"""
+    from src.client.gui import ArixaGUI
+    gui = ArixaGUI(_create_client(args, config))
+    gui.run()
+
+
+def _run_command(args, config):
+    """直接执行命令"""
+    client = _create_client(args, config)
+    
+    try:
+        if sys.stdout.isatty():
+            # 终端中边生成边输出；输出被重定向时只打印最终回复，便于脚本处理
+            from src.client.arixa_client import StreamWriter
+            client.execute(args.run, on_delta=StreamWriter())
+        else:
+            print(client.execute(args.run))
+    finally:
+        client.close()
+
+
+def _run_chat(args, config):
+    """交互式聊天"""
+    client = _create_client(args, config)
+    try:
+        client.chat_mode()
+    finally:
+        client.close()
+
+
+# 命令名（对应命令行参数）→ (处理函数, 是否需要 AI 配置)，按优先级排列
+COMMANDS = {
+    "setup": (_run_setup, False),
+    "list_tools": (_list_tools, False),
+    "server": (_run_server, False),
+    "gui": (_run_gui, True),
+    "run": (_run_command, True),
+    "chat": (_run_chat, True),
+}
+
+
 def main():
     """主入口函数"""
     import argparse
@@ -56,6 +138,10 @@ def main():
     
     args = parser.parse_args()
     
+    # 选择命令（按 COMMANDS 中的顺序匹配，未指定时默认进入聊天模式）
+    command = next((name for name in COMMANDS if getattr(args, name, None)), "chat")
+    handler, needs_ai = COMMANDS[command]
+    
     # 设置日志
     from src.utils.logger import setup_logger
     logger = setup_logger(debug=args.debug)
@@ -66,57 +152,19 @@ def main():
     config_path = args.config or os.path.expanduser("~/.arixa/config.json")
     config = ConfigManager(config_path)
     
-    # 首次配置
-    if args.setup:
-        from src.client.setup_wizard import SetupWizard
-        wizard = SetupWizard(config)
-        wizard.run()
-        return
-    
-    # 列出工具
-    if args.list_tools:
-        from src.mcp_server.server import MCPServer
-        server = MCPServer(config)
-        tools = server.get_tools_schema()
-        print("\n📋 可用工具列表:\n" + "="*50)
-        for tool in tools:
-            print(f"\n🔧 {tool['name']}")
-            print(f"   描述: {tool['description']}")
-            print(f"   分类: {tool['category']}")
-        return
+    # 在后台预热 AI 提供商的 SDK 导入，与 MCP 服务器的初始化并行（提供商解析方式与 _create_client 一致）
+    if needs_ai:
+        import threading
+        ai_provider = args.ai or config.get("ai.default_provider", "claude")
+        threading.Thread(target=_warmup_provider, args=(ai_provider,), daemon=True).start()
     
     # 检查是否已配置
-    if not config.is_configured() and not args.server:
+    if needs_ai and not config.is_configured():
         print("⚠️  Arixa 尚未配置，请先运行: arixa --setup")
         print("   或设置环境变量: ANTHROPIC_API_KEY / OPENAI_API_KEY / GOOGLE_API_KEY")
         return
     
-    # 创建客户端
-    from src.client.arixa_client import ArixaClient
-    
-    # 确定使用的 AI 提供商
-    ai_provider = args.ai or config.get("ai.default_provider", "claude")
-    model = args.model
-    
-    client = ArixaClient(config, ai_provider=ai_provider, model=model)
-    
-    if args.server:
-        # 启动 MCP 服务器
-        from src.mcp_server.server import MCPServer
-        server = MCPServer(config)
-        server.start()
-    elif args.gui:
-        # 启动图形界面
-        from src.client.gui import ArixaGUI
-        gui = ArixaGUI(client)
-        gui.run()
-    elif args.run:
-        # 直接执行命令
-        result = client.execute(args.run)
-        print(result)
-    else:
-        # 默认启动交互式聊天
-        client.chat_mode()
+    handler(args, config)
 
 
 if __name__ == "__main__":
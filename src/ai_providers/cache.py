@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Response Cache - AI 响应缓存
+避免对相同的请求重复调用远程 API
+
+缓存分两级:
+1. 进程内 LRU 字典（微秒级查找）
+2. 本地 SQLite 数据库 ~/.arixa/cache.db（跨会话持久化）
+
+缓存键由 (提供商, 模型, 系统提示词, 对话历史, 工具列表) 计算得出，
+只缓存成功的 API 响应，不缓存错误信息。
+
+可选的语义缓存（SemanticCache）在精确匹配未命中时，
+按用户消息的语义相似度查找措辞不同但意思相同的请求。
+"""
+
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any, Iterator, AsyncIterator, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+from src.ai_providers.provider_factory import AIProvider, StreamError
+from src.utils import json_utils
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    两级响应缓存
+    
+    内存层为 LRU，磁盘层为 SQLite，按 TTL 过期并限制总大小
+    """
+    
+    DEFAULT_PATH = "~/.arixa/cache.db"
+    
+    # 每写入多少条检查一次磁盘缓存大小
+    EVICT_INTERVAL = 100
+    
+    def __init__(self, path: Optional[str] = None, ttl: float = 3600,
+                 max_size_gb: float = 1.0, memory_size: int = 256):
+        """
+        初始化缓存
+        
+        Args:
+            path: SQLite 数据库路径，None 表示仅使用内存缓存
+            ttl: 缓存有效期（秒），0 表示永不过期
+            max_size_gb: 磁盘缓存的最大容量（GB）
+            memory_size: 内存缓存的最大条目数
+        """
+        self.ttl = ttl
+        self.max_size_bytes = int(max_size_gb * 1024 ** 3)
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = None
+        
+        # 命中统计
+        self.hits = 0
+        self.misses = 0
+        
+        if path:
+            path = os.path.expanduser(path)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.commit()
+            except Exception as e:
+                logger.warning(f"磁盘缓存初始化失败，仅使用内存缓存: {e}")
+                self._db = None
+    
+    @staticmethod
+    def make_key(provider: str, model: Optional[str], system_prompt: str,
+                 messages: List[Dict], tools: Optional[List[Dict]]) -> str:
+        """计算缓存键"""
+        payload = json_utils.dumps_bytes(
+            [provider, model, system_prompt, messages, tools or []],
+            sort_keys=True, default=str
+        )
+        return hashlib.blake2b(payload).hexdigest()
+    
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """读取缓存，未命中或已过期返回 None"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory)
+        }
+    
+    def _lookup(self, key: str) -> Optional[Dict]:
+        """依次查找内存层和磁盘层（调用方需持有锁）"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            created_at, value = entry
+            if not self._is_expired(created_at):
+                self._memory.move_to_end(key)
+                return value
+            del self._memory[key]
+        
+        if self._db is None:
+            return None
+        
+        row = self._db.execute(
+            "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        
+        if row is None:
+            return None
+        
+        if self._is_expired(row[1]):
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        
+        value = json_utils.loads(row[0])
+        self._remember(key, row[1], value)
+        return value
+    
+    def set(self, key: str, value: Dict):
+        """写入缓存"""
+        created_at = time.time()
+        
+        with self._lock:
+            self._remember(key, created_at, value)
+            
+            if self._db is None:
+                return
+            
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json_utils.dumps(value, default=str), created_at)
+                )
+                self._db.commit()
+            except Exception as e:
+                logger.warning(f"写入磁盘缓存失败: {e}")
+                return
+            
+            self._writes += 1
+            if self._writes % self.EVICT_INTERVAL == 0:
+                self._evict()
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+    
+    def _remember(self, key: str, created_at: float, value: Dict):
+        """写入内存层，超出容量时淘汰最久未使用的条目"""
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+    
+    def _evict(self):
+        """清理过期条目，并在超出容量时删除最旧的条目"""
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        
+        total = self._db.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM responses").fetchone()[0]
+        if total > self.max_size_bytes:
+            # 按写入时间从旧到新删除，直到容量回到上限以内
+            excess = total - self.max_size_bytes
+            for key, size in self._db.execute(
+                "SELECT key, LENGTH(value) FROM responses ORDER BY created_at"
+            ).fetchall():
+                if excess <= 0:
+                    break
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                excess -= size
+        
+        self._db.commit()
+
+
+class SemanticCache:
+    """
+    语义缓存
+    
+    用本地嵌入模型将用户消息转换为单位向量，与已缓存消息的余弦相似度
+    达到阈值时直接返回缓存的响应。只用于对话的第一条消息：后续轮次
+    包含工具执行结果，语义相近并不代表请求等价。
+    
+    需要 sentence-transformers（依赖 numpy），未安装时自动停用
+    """
+    
+    DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    
+    def __init__(self, threshold: float = 0.92, model_name: Optional[str] = None,
+                 max_entries: int = 1000):
+        """
+        初始化语义缓存
+        
+        Args:
+            threshold: 余弦相似度阈值
+            model_name: 嵌入模型名称
+            max_entries: 每个命名空间最多保存的条目数
+        """
+        self.threshold = threshold
+        self.model_name = model_name or self.DEFAULT_MODEL
+        self.max_entries = max_entries
+        self._model = None  # None 表示尚未加载，False 表示不可用
+        self._np = None
+        # 命名空间 → 向量存储
+        self._entries: Dict[str, "_VectorStore"] = {}
+        self._lock = threading.Lock()
+    
+    def embed(self, text: str) -> Optional[Any]:
+        """计算文本的单位向量（float32），嵌入模型不可用时返回 None"""
+        with self._lock:
+            if self._model is None:
+                try:
+                    import numpy as np
+                    from sentence_transformers import SentenceTransformer
+                    self._np = np
+                    self._model = SentenceTransformer(self.model_name)
+                except ImportError:
+                    logger.warning("sentence-transformers 库未安装，语义缓存已停用，运行: pip install sentence-transformers")
+                    self._model = False
+                except Exception as e:
+                    logger.warning(f"嵌入模型加载失败，语义缓存已停用: {e}")
+                    self._model = False
+        
+        if not self._model:
+            return None
+        vector = self._model.encode(text, normalize_embeddings=True)
+        return self._np.asarray(vector, dtype=self._np.float32)
+    
+    def search(self, namespace: str, vector: Any) -> Optional[Dict]:
+        """查找相似度最高且达到阈值的缓存响应"""
+        with self._lock:
+            store = self._entries.get(namespace)
+            if store is None:
+                return None
+            
+            # 向量均已归一化，余弦相似度即点积（矩阵乘向量由 BLAS 完成）
+            scores = store.matrix[:store.size] @ vector
+            best = int(scores.argmax())
+            if scores[best] >= self.threshold:
+                return store.responses[best]
+        
+        return None
+    
+    def add(self, namespace: str, vector: Any, value: Dict):
+        """写入缓存，超出容量时覆盖最早的条目"""
+        with self._lock:
+            store = self._entries.get(namespace)
+            if store is None:
+                store = self._entries[namespace] = _VectorStore(self._np, len(vector), self.max_entries)
+            store.add(vector, value)
+
+
+class _VectorStore:
+    """
+    一个命名空间的向量存储
+    
+    向量按行保存在一个连续的 float32 矩阵中，写入时原地复制一行，
+    容量不足时按倍数扩容，达到上限后作为环形缓冲区覆盖最早的条目
+    """
+    
+    __slots__ = ("np", "matrix", "responses", "size", "capacity", "next")
+    
+    INITIAL_CAPACITY = 64
+    
+    def __init__(self, np, dim: int, capacity: int):
+        self.np = np
+        self.capacity = max(1, capacity)
+        self.matrix = np.empty((min(self.INITIAL_CAPACITY, self.capacity), dim), dtype=np.float32)
+        self.responses: List[Dict] = []
+        self.size = 0
+        self.next = 0
+    
+    def add(self, vector: Any, value: Dict):
+        if self.size == len(self.matrix) and self.size < self.capacity:
+            grown = self.np.empty((min(self.size * 2, self.capacity), self.matrix.shape[1]), dtype=self.np.float32)
+            grown[:self.size] = self.matrix
+            self.matrix = grown
+        
+        self.matrix[self.next] = vector
+        if self.size < self.capacity:
+            self.responses.append(value)
+            self.size += 1
+        else:
+            self.responses[self.next] = value
+        self.next = (self.next + 1) % self.capacity
+
+
+class CachedProvider(AIProvider):
+    """
+    带缓存的 AI 提供商
+    
+    包装任意 AIProvider，相同请求直接返回缓存的响应（缓存的响应不含 raw_response）
+    """
+    
+    __slots__ = ("provider", "cache", "semantic")
+    
+    def __init__(self, provider: AIProvider, cache: ResponseCache,
+                 semantic: Optional[SemanticCache] = None):
+        super().__init__(provider.api_key, provider.model, provider.base_url, provider.temperature)
+        self.provider = provider
+        self.cache = cache
+        self.semantic = semantic
+    
+    @property
+    def MAX_CONCURRENCY(self) -> int:
+        return self.provider.MAX_CONCURRENCY
+    
+    def __getattr__(self, name: str) -> Any:
+        # 其余属性（如 client）透传给被包装的提供商
+        if name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider, name)
+    
+    def _cache_key(self, messages: List[Dict], system_prompt: str, tools: List[Dict]) -> str:
+        return ResponseCache.make_key(self.provider.get_name(), self.provider.model,
+                                      system_prompt, messages, tools)
+    
+    def _lookup(self, key: str, messages: List[Dict], system_prompt: str,
+                tools: List[Dict]) -> Tuple[Optional[Dict], Optional[tuple]]:
+        """
+        先精确匹配，未命中时再按语义查找
+        
+        Returns:
+            (缓存的响应, 语义查询 (命名空间, 向量))，语义缓存不适用时查询为 None
+        """
+        cached = self.cache.get(key)
+        if cached is not None or self.semantic is None or len(messages) != 1:
+            return cached, None
+        
+        vector = self.semantic.embed(messages[0]["content"])
+        if vector is None:
+            return None, None
+        
+        query = (self._cache_key([], system_prompt, tools), vector)
+        return self.semantic.search(*query), query
+    
+    def _store(self, key: str, result: Dict, query: Optional[tuple] = None):
+        # 错误信息不缓存
+        if not result.get("error"):
+            value = {"content": result["content"], "tool_calls": result["tool_calls"]}
+            self.cache.set(key, value)
+            if query is not None:
+                self.semantic.add(*query, value)
+    
+    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+             include_raw: bool = False) -> Dict:
+        key = self._cache_key(messages, system_prompt, tools)
+        cached, query = self._lookup(key, messages, system_prompt, tools)
+        if cached is not None:
+            logger.debug("命中响应缓存")
+            return cached
+        
+        result = self.provider.chat(messages, system_prompt, tools, include_raw)
+        self._store(key, result, query)
+        return result
+    
+    def chat_stream(self, messages: List[Dict], system_prompt: str = "") -> Iterator[str]:
+        key = self._cache_key(messages, system_prompt, None)
+        cached, query = self._lookup(key, messages, system_prompt, None)
+        if cached is not None:
+            logger.debug("命中响应缓存")
+            yield cached["content"]
+            return
+        
+        parts = []
+        stream = self.provider.chat_stream(messages, system_prompt)
+        try:
+            for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            stream.close()
+        
+        # 只有完整接收（调用方没有提前关闭流）且没有出错的回复才写入缓存
+        self._store_stream(key, parts, query)
+    
+    async def astream(self, messages: List[Dict], system_prompt: str = "") -> AsyncIterator[str]:
+        key = self._cache_key(messages, system_prompt, None)
+        cached, query = self._lookup(key, messages, system_prompt, None)
+        if cached is not None:
+            logger.debug("命中响应缓存")
+            yield cached["content"]
+            return
+        
+        parts = []
+        stream = self.provider.astream(messages, system_prompt)
+        try:
+            async for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            await stream.aclose()
+        
+        self._store_stream(key, parts, query)
+    
+    def _store_stream(self, key: str, parts: List[str], query: Optional[tuple]):
+        """缓存完整接收的流式回复（工具调用由调用方从文本中提取，这里只保存文本）"""
+        error = any(isinstance(part, StreamError) for part in parts)
+        self._store(key, {"content": "".join(parts), "tool_calls": [], "error": error}, query)
+    
+    async def achat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+                    include_raw: bool = False) -> Dict:
+        key = self._cache_key(messages, system_prompt, tools)
+        cached, query = self._lookup(key, messages, system_prompt, tools)
+        if cached is not None:
+            logger.debug("命中响应缓存")
+            return cached
+        
+        result = await self.provider.achat(messages, system_prompt, tools, include_raw)
+        self._store(key, result, query)
+        return result
+    
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+    
+    def get_name(self) -> str:
+        return self.provider.get_name()
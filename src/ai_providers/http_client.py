@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+HTTP Client - 云端提供商共享的 HTTP 连接池
+anthropic / openai SDK 默认各自创建 httpx 连接池，
+多个提供商（或同一提供商的多个实例）共用一个连接池可复用 TLS 连接、减少文件描述符
+
+httpx.AsyncClient 的连接绑定在创建它的事件循环上，跨事件循环复用会出错，
+因此异步连接池按事件循环分别创建，同一事件循环内的所有提供商共用
+"""
+
+from typing import Optional
+import atexit
+import threading
+import weakref
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 连接池大小与超时（读超时与 SDK 默认值一致，长回复可能需要数分钟）
+MAX_CONNECTIONS = 200
+MAX_KEEPALIVE_CONNECTIONS = 100
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 600.0
+
+# 异步连接池与 AIProvider.MAX_CONCURRENCY 一致，chat_batch 的并发请求不必排队等待连接
+ASYNC_MAX_CONNECTIONS = 500
+ASYNC_MAX_KEEPALIVE_CONNECTIONS = 250
+
+_client = None
+_lock = threading.Lock()
+
+# 事件循环 → httpx.AsyncClient
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _http2_available() -> bool:
+    """是否安装了 HTTP/2 支持（h2）"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_http_client() -> Optional["httpx.Client"]:
+    """
+    获取共享的 httpx.Client（首次调用时创建）
+    
+    安装了 h2 时启用 HTTP/2，并发请求复用同一连接
+    
+    Returns:
+        httpx.Client，httpx 未安装时返回 None（由 SDK 使用默认连接池）
+    """
+    global _client
+    if _client is not None:
+        return _client
+    
+    with _lock:
+        if _client is None:
+            try:
+                import httpx
+            except ImportError:
+                return None
+            
+            http2 = _http2_available()
+            _client = httpx.Client(
+                http2=http2,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS),
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+            )
+            atexit.register(_client.close)
+            logger.debug(f"共享 HTTP 客户端已创建（HTTP/2: {http2}）")
+    
+    return _client
+
+
+def get_async_http_client() -> Optional["httpx.AsyncClient"]:
+    """
+    获取当前事件循环共享的 httpx.AsyncClient（首次调用时创建），必须在协程中调用
+    
+    Returns:
+        httpx.AsyncClient，httpx 未安装时返回 None
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    
+    import asyncio
+    loop = asyncio.get_running_loop()
+    
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS,
+                                max_keepalive_connections=ASYNC_MAX_KEEPALIVE_CONNECTIONS),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+        _async_clients[loop] = client
+    
+    return client
+
+
+async def aclose_async_http_client():
+    """关闭当前事件循环的共享异步连接池"""
+    import asyncio
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -19,24 +19,305 @@ AI Provider Factory - AI 提供商工厂
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Any
-import json
+from types import MappingProxyType
+from typing import List, Dict, Optional, Any, Iterator, AsyncIterator, Tuple, Callable
+import atexit
+import functools
+import importlib
 import os
+import threading
+import time
 import logging
 
+from src.ai_providers.http_client import get_http_client, get_async_http_client, aclose_async_http_client
+from src.ai_providers.retry import retry_call, aretry_call, SDK_MAX_RETRIES
+from src.utils import json_utils
+
 logger = logging.getLogger(__name__)
 
+# AI 回复中 JSON 代码块的起止标记
+_JSON_FENCE = "```json"
+_FENCE = "```"
+
+# SDK 客户端缓存：(SDK 类名, api_key, base_url) → 客户端
+# 相同配置的提供商实例共用同一个客户端及其连接池
+_client_cache: Dict[tuple, Any] = {}
+_client_lock = threading.Lock()
+
+
+def _shared_client(key: tuple, factory: Callable[[], Any]) -> Any:
+    """获取缓存的 SDK 客户端，不存在时调用 factory 创建"""
+    with _client_lock:
+        client = _client_cache.get(key)
+        if client is None:
+            client = factory()
+            _client_cache[key] = client
+        return client
+
+
+def _iter_json_blocks(text: str) -> Iterator[str]:
+    """逐个返回文本中 ```json 代码块的内容（单次扫描，不使用正则）"""
+    pos = 0
+    while True:
+        start = text.find(_JSON_FENCE, pos)
+        if start < 0:
+            return
+        start += len(_JSON_FENCE)
+        
+        end = text.find(_FENCE, start)
+        if end < 0:
+            return
+        
+        yield text[start:end].strip()
+        pos = end + len(_FENCE)
+
+
+def _parse_tool_block(block: str) -> List[Dict]:
+    """
+    解析一个 ```json 代码块中的工具调用，不是工具调用时返回空列表
+    
+    支持单个工具调用 {"action": "tool_call", ...}、多步调用 {"action": "multi_step", "steps": [...]}
+    以及省略 action 的 {"tool": ..., "parameters": {...}}
+    """
+    try:
+        data = json_utils.loads(block)
+    except json_utils.JSONDecodeError:
+        return []
+    
+    if not isinstance(data, dict):
+        return []
+    
+    if data.get("action") == "tool_call":
+        return [{
+            "name": data.get("tool"),
+            "arguments": data.get("parameters", {})
+        }]
+    elif data.get("action") == "multi_step":
+        return [{
+            "name": step.get("tool"),
+            "arguments": step.get("parameters", {})
+        } for step in data.get("steps", [])]
+    elif "tool" in data and "parameters" in data:
+        return [{
+            "name": data.get("tool"),
+            "arguments": data.get("parameters", {})
+        }]
+    
+    return []
+
+
+def parse_tool_blocks(text: str) -> List[Dict]:
+    """
+    从 AI 回复的 ```json 代码块中提取工具调用
+    
+    系统提示词要求每次回复只包含一个工具调用块（多步任务用 multi_step），
+    只使用第一个工具调用块，与流式模式（ToolCallWatcher）的解析结果一致
+    """
+    # 纯文本回复（最常见的最终回复）不含代码块，直接返回
+    if _JSON_FENCE not in text:
+        return []
+    
+    for block in _iter_json_blocks(text):
+        tool_calls = _parse_tool_block(block)
+        if tool_calls:
+            return tool_calls
+    return []
+
+
+class StreamError(str):
+    """
+    流式回复中的错误信息
+    
+    仍是普通字符串，可以直接显示；调用方（如响应缓存）据此区分错误与正常回复
+    """
+    __slots__ = ()
+
+
+class ToolCallWatcher:
+    """
+    流式回复中的工具调用检测
+    
+    逐段接收流式文本，收到第一个完整的工具调用代码块时 feed() 返回 True，
+    调用方即可关闭流：系统提示词要求每次回复只包含一个工具调用块（多步任务用 multi_step），
+    代码块之后生成的内容都不会被使用。
+    
+    用法:
+        watcher = ToolCallWatcher()
+        for chunk in stream:
+            if watcher.feed(chunk):
+                break
+        text, tool_calls = watcher.text, watcher.tool_calls
+    """
+    
+    __slots__ = ("text", "tool_calls", "_pos")
+    
+    def __init__(self):
+        self.text = ""
+        self.tool_calls: List[Dict] = []
+        self._pos = 0  # 下一次查找 ```json 的起点
+    
+    def feed(self, chunk: str) -> bool:
+        """追加一段文本，已收到完整的工具调用块时返回 True"""
+        self.text += chunk
+        
+        while True:
+            start = self.text.find(_JSON_FENCE, self._pos)
+            if start < 0:
+                # 代码块标记可能被拆在两段文本之间，保留末尾不完整的部分下次重新查找
+                self._pos = max(self._pos, len(self.text) - len(_JSON_FENCE) + 1)
+                return False
+            
+            body = start + len(_JSON_FENCE)
+            end = self.text.find(_FENCE, body)
+            if end < 0:
+                # 代码块尚未结束，下次从代码块开头继续
+                self._pos = start
+                return False
+            
+            self._pos = end + len(_FENCE)
+            tool_calls = _parse_tool_block(self.text[body:end].strip())
+            if tool_calls:
+                self.tool_calls = tool_calls
+                return True
+
+
+# 工具格式转换缓存：(格式, 工具列表键) → (原工具列表, 转换结果)
+# 保留原工具列表的引用，保证缓存期间键中的 id 不会被其他对象复用
+_converted_tools: Dict[tuple, Tuple[List[Dict], List[Dict]]] = {}
+MAX_CONVERTED_TOOLS = 16
+
+
+def _input_schema(parameters: Dict) -> Dict:
+    """把 MCP 工具的参数定义转换为 JSON Schema 对象（Claude 与 OpenAI 格式共用）"""
+    return {
+        "type": "object",
+        "properties": parameters,
+        "required": [name for name, spec in parameters.items() if spec.get("required")]
+    }
+
+
+def _convert_tools_cached(fmt: str, tools: List[Dict], convert: Callable[[List[Dict]], List[Dict]]) -> List[Dict]:
+    """
+    转换工具定义并缓存结果
+    
+    传入的工具列表可能是新建的（如按语义筛选出的子集），但其中的 parameters 字典是同一批对象，
+    因此以 (名称, 描述, id(parameters)) 作为键，工具列表不变时直接复用转换结果
+    """
+    key = (fmt, tuple((t["name"], t["description"], id(t.get("parameters"))) for t in tools))
+    
+    entry = _converted_tools.get(key)
+    if entry is not None:
+        return entry[1]
+    
+    converted = convert(tools)
+    if len(_converted_tools) >= MAX_CONVERTED_TOOLS:
+        _converted_tools.clear()
+    _converted_tools[key] = (tools, converted)
+    
+    return converted
+
+
+@functools.lru_cache(maxsize=32)
+def _system_message(system_prompt: str) -> Dict:
+    """系统提示词对应的消息（同一提示词复用同一个字典，调用方不得修改）"""
+    return {"role": "system", "content": system_prompt}
+
+
+def _with_system(messages: List[Dict], system_prompt: str) -> List[Dict]:
+    """把系统提示词作为第一条消息，没有系统提示词时直接返回原列表（SDK 不会修改它）"""
+    if not system_prompt:
+        return messages
+    return [_system_message(system_prompt), *messages]
+
+
+# chat_many / achat_many 中因前面的请求失败而未发送的请求的回复
+# 与各提供商的 *_REPLY 常量一样为共享对象，tool_calls 使用元组，调用方只读不改
+CANCELLED_REPLY = {"content": "已取消: 前面的请求失败", "tool_calls": (), "error": True}
+
+
+# tiktoken 编码器（可选依赖，None 表示尚未加载，False 表示不可用）
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    估算文本的 token 数
+    
+    安装了 tiktoken 时精确计数（OpenAI 编码，对其他模型也足够接近），
+    否则按 ASCII 约 4 字符/token、中文等字符约 1 字符/token 估算
+    """
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = False
+    
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    
+    # 非 ASCII 字符在 UTF-8 中占 2~4 字节，用字节数与字符数之差近似其数量
+    non_ascii = (len(text.encode("utf-8")) - len(text)) // 2
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+# 对话历史中的消息每轮都会重新计数，按内容缓存计数结果
+_cached_count_tokens = functools.lru_cache(maxsize=4096)(count_tokens)
+
+
+def fit_messages(messages: List[Dict], budget: int) -> Tuple[int, int]:
+    """
+    计算对话历史需要从开头丢弃多少条消息才能不超过 token 预算
+    
+    始终保留最后一条消息，并保证保留的历史以用户消息开头
+    
+    Returns:
+        (需丢弃的消息数, 保留部分的 token 数)
+    """
+    sizes = [_cached_count_tokens(msg["content"]) for msg in messages]
+    total = sum(sizes)
+    
+    start = 0
+    while start < len(messages) - 1 and (total > budget or messages[start]["role"] != "user"):
+        total -= sizes[start]
+        start += 1
+    
+    return start, total
+
 
 class AIProvider(ABC):
     """AI 提供商基类"""
     
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, base_url: Optional[str] = None):
+    # 实例属性固定，使用 __slots__ 省去每个实例的 __dict__（子类需各自声明新增的属性）
+    __slots__ = ("api_key", "model", "base_url", "temperature", "_bound_aclient")
+    
+    # chat_batch 的最大并发请求数（云端 API 受 QPM 限制）
+    MAX_CONCURRENCY = 500
+    
+    # 模型上下文窗口大小与单次回复的最大 token 数
+    CONTEXT_WINDOW = 128000
+    MAX_OUTPUT_TOKENS = 4096
+    
+    # 客户端依赖的 SDK 模块（用于预热导入）
+    SDK_MODULE: Optional[str] = None
+    
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, base_url: Optional[str] = None,
+                 temperature: Optional[float] = None):
         self.api_key = api_key
         self.model = model
         self.base_url = base_url
+        self.temperature = temperature  # 采样温度，None 表示使用提供商的默认值
+        self._bound_aclient = None
+    
+    @property
+    def deterministic(self) -> bool:
+        """温度为 0 时相同请求得到相同回复，只有这时才能缓存响应"""
+        return self.temperature == 0
     
     @abstractmethod
-    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None) -> Dict:
+    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+             include_raw: bool = False) -> Dict:
         """
         发送聊天请求
         
@@ -44,16 +325,186 @@ class AIProvider(ABC):
             messages: 对话历史 [{"role": "user/assistant", "content": "..."}]
             system_prompt: 系统提示词
             tools: 可用工具列表（用于 function calling）
+            include_raw: 是否在结果中附带 SDK 的原始响应（会一直占用内存，默认不附带）
         
         Returns:
             {
                 "content": "AI的文本回复",
                 "tool_calls": [{"name": "工具名", "arguments": {...}}],  # 可选
-                "raw_response": ...  # 原始响应
+                "raw_response": ...,  # 原始响应（仅 include_raw=True 且请求成功时）
+                "error": True         # 仅出错时
             }
+            返回值可能是共享的常量（如 NOT_INITIALIZED_REPLY），调用方不应修改
         """
         pass
     
+    def chat_stream(self, messages: List[Dict], system_prompt: str = "") -> Iterator[str]:
+        """
+        流式发送聊天请求，逐段返回 AI 的文本回复
+        
+        默认一次性返回 chat() 的完整回复，子类可使用 SDK 的流式接口覆盖。
+        流式模式不使用 function calling，工具调用由调用方从文本中的 JSON 块提取。
+        出错时返回一段 StreamError（错误信息文本）后结束。
+        
+        Args:
+            messages: 对话历史
+            system_prompt: 系统提示词
+        
+        Yields:
+            文本片段
+        """
+        reply = self.chat(messages, system_prompt)
+        content = reply.get("content", "")
+        yield StreamError(content) if reply.get("error") else content
+    
+    async def astream(self, messages: List[Dict], system_prompt: str = "") -> AsyncIterator[str]:
+        """
+        chat_stream 的异步版本
+        
+        默认在线程池中逐段读取同步的 chat_stream()，子类可使用异步客户端覆盖。
+        调用方提前结束迭代时应调用 aclose()，以便及时关闭底层连接。
+        
+        Args/Yields: 同 chat_stream()
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        stream = self.chat_stream(messages, system_prompt)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, stream, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            stream.close()
+    
+    async def achat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+                    include_raw: bool = False) -> Dict:
+        """
+        异步发送聊天请求
+        
+        默认在线程池中执行同步的 chat()，子类可使用 SDK 的异步客户端覆盖
+        
+        Args/Returns: 同 chat()
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.chat, messages, system_prompt, tools, include_raw))
+    
+    async def chat_batch(self, batch: List[List[Dict]], system_prompt: str = "", 
+                         tools: List[Dict] = None) -> List[Dict]:
+        """
+        并发发送多组对话请求
+        
+        Args:
+            batch: 多组对话历史，每组格式同 chat() 的 messages
+            system_prompt: 系统提示词（所有请求共用）
+            tools: 可用工具列表（所有请求共用）
+        
+        Returns:
+            与 batch 顺序一致的响应列表
+        """
+        return await self.achat_many([(messages, system_prompt) for messages in batch],
+                                     max_concurrent=self.MAX_CONCURRENCY, tools=tools)
+    
+    async def achat_many(self, prompts: List[Tuple[List[Dict], str]], max_concurrent: int = 32,
+                         stop_on_error: bool = False, tools: List[Dict] = None) -> List[Dict]:
+        """
+        并发发送多个相互独立的请求（chat_many 的异步版本）
+        
+        云端提供商的 achat() 会对 429 等瞬时错误退避重试
+        
+        Args/Returns: 同 chat_many()
+        """
+        import asyncio
+        semaphore = asyncio.Semaphore(max(1, min(max_concurrent, self.MAX_CONCURRENCY)))
+        failed = False
+        
+        async def _chat_one(messages: List[Dict], system_prompt: str) -> Optional[Dict]:
+            nonlocal failed
+            async with semaphore:
+                # 已有请求失败时，尚未开始的请求不再发送
+                if failed:
+                    return None
+                
+                try:
+                    result = await self.achat(messages, system_prompt, tools)
+                except Exception as e:
+                    result = {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+                
+                if stop_on_error and result.get("error"):
+                    failed = True
+                return result
+        
+        results = await asyncio.gather(*[_chat_one(m, s) for m, s in prompts])
+        
+        return [r if r is not None else CANCELLED_REPLY for r in results]
+    
+    def chat_many(self, prompts: List[Tuple[List[Dict], str]], max_concurrent: int = 8,
+                  stop_on_error: bool = False, tools: List[Dict] = None) -> List[Dict]:
+        """
+        并发发送多个相互独立的请求（同步版本，使用线程池）
+        
+        Args:
+            prompts: 请求列表，每项为 (对话历史, 系统提示词)
+            max_concurrent: 最大并发请求数
+            stop_on_error: 为 True 时，任一请求失败后取消尚未开始的请求
+            tools: 可用工具列表（所有请求共用）
+        
+        Returns:
+            与 prompts 顺序一致的响应列表，被取消的请求返回取消说明
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        
+        results: List[Optional[Dict]] = [None] * len(prompts)
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrent, self.MAX_CONCURRENCY))) as pool:
+            futures = {
+                pool.submit(self.chat, messages, system_prompt, tools): i
+                for i, (messages, system_prompt) in enumerate(prompts)
+            }
+            
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+                
+                if stop_on_error and results[i].get("error"):
+                    for f in futures:
+                        f.cancel()
+        
+        return [
+            r if r is not None else CANCELLED_REPLY
+            for r in results
+        ]
+    
+    def _fit_context(self, messages: List[Dict], system_prompt: str = "") -> Tuple[List[Dict], int]:
+        """
+        裁剪对话历史，使请求不超出模型的上下文窗口
+        
+        从最早的对话轮次开始丢弃，始终保留最后一条消息，并保证历史以用户消息开头
+        
+        Returns:
+            (裁剪后的对话历史, 本次请求可用的最大回复 token 数)
+        """
+        system_tokens = _cached_count_tokens(system_prompt)
+        budget = self.CONTEXT_WINDOW - self.MAX_OUTPUT_TOKENS - system_tokens
+        
+        start, total = fit_messages(messages, budget)
+        if start:
+            logger.info(f"对话历史超出上下文窗口，已丢弃最早的 {start} 条消息")
+            messages = messages[start:]
+        
+        input_tokens = total + system_tokens
+        max_tokens = max(1, min(self.MAX_OUTPUT_TOKENS, self.CONTEXT_WINDOW - input_tokens))
+        
+        return messages, max_tokens
+    
     @abstractmethod
     def is_available(self) -> bool:
         """检查是否可用"""
@@ -62,16 +513,49 @@ class AIProvider(ABC):
     def get_name(self) -> str:
         """获取提供商名称"""
         return self.__class__.__name__.replace("Provider", "")
+    
+    def _extract_tool_calls(self, text: str) -> List[Dict]:
+        """从文本中提取工具调用（解析 JSON 块）"""
+        return parse_tool_blocks(text)
+    
+    def _get_aclient(self):
+        """
+        获取使用当前事件循环共享连接池的异步 SDK 客户端（self.aclient 的副本）
+        
+        httpx 不可用时直接返回 self.aclient
+        """
+        http_client = get_async_http_client()
+        if http_client is None:
+            return self.aclient
+        
+        bound = self._bound_aclient
+        if bound is None or bound[0] is not http_client:
+            bound = (http_client, self.aclient.with_options(http_client=http_client))
+            self._bound_aclient = bound
+        
+        return bound[1]
 
 
 class ClaudeProvider(AIProvider):
     """Claude (Anthropic) 提供商"""
     
+    __slots__ = ("client", "aclient")
+    
+    # 客户端未初始化时的回复
+    NOT_INITIALIZED_ERROR = "错误: Claude API 客户端未初始化，请检查 API Key"
+    NOT_INITIALIZED_REPLY = {"content": NOT_INITIALIZED_ERROR, "tool_calls": (), "error": True}
+    
     DEFAULT_MODEL = "claude-sonnet-4-20250514"
+    SDK_MODULE = "anthropic"
+    CONTEXT_WINDOW = 200000
+    
+    # 提示词缓存标记（缓存到带此标记的块为止的全部前缀）
+    CACHE_CONTROL = {"type": "ephemeral"}
     
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, **kwargs):
-        super().__init__(api_key, model or self.DEFAULT_MODEL)
+        super().__init__(api_key, model or self.DEFAULT_MODEL, temperature=kwargs.get("temperature"))
         self.client = None
+        self.aclient = None
         
         # 尝试从环境变量获取 API Key
         self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
@@ -79,51 +563,101 @@ class ClaudeProvider(AIProvider):
         if self.api_key:
             try:
                 import anthropic
-                self.client = anthropic.Anthropic(api_key=self.api_key)
+                self.client = _shared_client(
+                    ("Anthropic", self.api_key, None),
+                    lambda: anthropic.Anthropic(api_key=self.api_key, max_retries=SDK_MAX_RETRIES,
+                                                http_client=get_http_client())
+                )
+                self.aclient = _shared_client(
+                    ("AsyncAnthropic", self.api_key, None),
+                    lambda: anthropic.AsyncAnthropic(api_key=self.api_key, max_retries=SDK_MAX_RETRIES)
+                )
                 logger.info(f"Claude 客户端初始化成功，模型: {self.model}")
             except ImportError:
                 logger.warning("anthropic 库未安装，运行: pip install anthropic")
             except Exception as e:
                 logger.error(f"Claude 客户端初始化失败: {e}")
     
-    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None) -> Dict:
+    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+             include_raw: bool = False) -> Dict:
         if not self.client:
-            return {"content": "错误: Claude API 客户端未初始化，请检查 API Key", "tool_calls": []}
+            return self.NOT_INITIALIZED_REPLY
         
         try:
-            # 构建请求参数
-            params = {
-                "model": self.model,
-                "max_tokens": 4096,
-                "messages": messages
-            }
-            
-            if system_prompt:
-                params["system"] = system_prompt
-            
-            # 添加工具定义（如果有）
-            if tools:
-                params["tools"] = self._convert_tools_to_claude_format(tools)
-            
-            response = self.client.messages.create(**params)
-            
-            # 解析响应
-            result = {"content": "", "tool_calls": [], "raw_response": response}
+            response = self.client.messages.create(**self._build_params(messages, system_prompt, tools))
+            return self._parse_response(response, include_raw)
             
-            for block in response.content:
-                if block.type == "text":
-                    result["content"] += block.text
-                elif block.type == "tool_use":
-                    result["tool_calls"].append({
-                        "name": block.name,
-                        "arguments": block.input
-                    })
-            
-            return result
+        except Exception as e:
+            logger.error(f"Claude API 错误: {e}")
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+    
+    def chat_stream(self, messages: List[Dict], system_prompt: str = "") -> Iterator[str]:
+        if not self.client:
+            yield StreamError(self.NOT_INITIALIZED_ERROR)
+            return
+        
+        try:
+            with self.client.messages.stream(**self._build_params(messages, system_prompt, None)) as stream:
+                for text in stream.text_stream:
+                    yield text
+                    
+        except Exception as e:
+            logger.error(f"Claude API 错误: {e}")
+            yield StreamError(f"API 错误: {e}")
+    
+    async def achat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+                    include_raw: bool = False) -> Dict:
+        if not self.aclient:
+            return self.NOT_INITIALIZED_REPLY
+        
+        try:
+            response = await self._get_aclient().messages.create(**self._build_params(messages, system_prompt, tools))
+            return self._parse_response(response, include_raw)
             
         except Exception as e:
             logger.error(f"Claude API 错误: {e}")
-            return {"content": f"API 错误: {e}", "tool_calls": []}
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+    
+    def _build_params(self, messages: List[Dict], system_prompt: str, tools: List[Dict]) -> Dict:
+        """构建请求参数"""
+        messages, max_tokens = self._fit_context(messages, system_prompt)
+        
+        params = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "messages": messages
+        }
+        if self.temperature is not None:
+            params["temperature"] = self.temperature
+        
+        # 系统提示词和工具定义是每轮对话都相同的前缀，标记为可缓存，
+        # 命中时这部分输入按约 10% 计费且不再重新计算；动态内容只能放在 messages 中
+        if system_prompt:
+            params["system"] = [{"type": "text", "text": system_prompt, "cache_control": self.CACHE_CONTROL}]
+        
+        # 添加工具定义（如果有）
+        if tools:
+            params["tools"] = _convert_tools_cached("claude", tools, self._convert_tools_to_claude_format)
+        
+        return params
+    
+    def _parse_response(self, response, include_raw: bool = False) -> Dict:
+        """解析响应"""
+        result = {"content": "", "tool_calls": []}
+        
+        for block in response.content:
+            if block.type == "text":
+                result["content"] += block.text
+            elif block.type == "tool_use":
+                result["tool_calls"].append({
+                    "name": block.name,
+                    "arguments": block.input
+                })
+        
+        if include_raw:
+            result["raw_response"] = response
+        
+        return result
     
     def _convert_tools_to_claude_format(self, tools: List[Dict]) -> List[Dict]:
         """转换工具格式为 Claude 格式"""
@@ -132,12 +666,12 @@ class ClaudeProvider(AIProvider):
             claude_tools.append({
                 "name": tool["name"],
                 "description": tool["description"],
-                "input_schema": {
-                    "type": "object",
-                    "properties": tool.get("parameters", {}),
-                    "required": [k for k, v in tool.get("parameters", {}).items() if v.get("required")]
-                }
+                "input_schema": _input_schema(tool.get("parameters", {}))
             })
+        
+        # 缓存断点放在最后一个工具上，整个工具列表作为一个缓存前缀
+        if claude_tools:
+            claude_tools[-1]["cache_control"] = self.CACHE_CONTROL
         return claude_tools
     
     def is_available(self) -> bool:
@@ -147,70 +681,126 @@ class ClaudeProvider(AIProvider):
 class ChatGPTProvider(AIProvider):
     """ChatGPT (OpenAI) 提供商"""
     
+    __slots__ = ("client", "aclient")
+    
+    # 客户端未初始化时的回复
+    NOT_INITIALIZED_ERROR = "错误: OpenAI API 客户端未初始化，请检查 API Key"
+    NOT_INITIALIZED_REPLY = {"content": NOT_INITIALIZED_ERROR, "tool_calls": (), "error": True}
+    
     DEFAULT_MODEL = "gpt-4-turbo-preview"
+    SDK_MODULE = "openai"
     
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, base_url: Optional[str] = None, **kwargs):
-        super().__init__(api_key, model or self.DEFAULT_MODEL, base_url)
+        super().__init__(api_key, model or self.DEFAULT_MODEL, base_url, kwargs.get("temperature"))
         self.client = None
+        self.aclient = None
         
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         
         if self.api_key:
             try:
-                from openai import OpenAI
-                client_kwargs = {"api_key": self.api_key}
+                from openai import OpenAI, AsyncOpenAI
+                client_kwargs = {"api_key": self.api_key, "max_retries": SDK_MAX_RETRIES}
                 if base_url:
                     client_kwargs["base_url"] = base_url
-                self.client = OpenAI(**client_kwargs)
+                self.client = _shared_client(
+                    ("OpenAI", self.api_key, base_url),
+                    lambda: OpenAI(http_client=get_http_client(), **client_kwargs)
+                )
+                self.aclient = _shared_client(
+                    ("AsyncOpenAI", self.api_key, base_url),
+                    lambda: AsyncOpenAI(**client_kwargs)
+                )
                 logger.info(f"OpenAI 客户端初始化成功，模型: {self.model}")
             except ImportError:
                 logger.warning("openai 库未安装，运行: pip install openai")
             except Exception as e:
                 logger.error(f"OpenAI 客户端初始化失败: {e}")
     
-    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None) -> Dict:
+    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+             include_raw: bool = False) -> Dict:
         if not self.client:
-            return {"content": "错误: OpenAI API 客户端未初始化，请检查 API Key", "tool_calls": []}
+            return self.NOT_INITIALIZED_REPLY
         
         try:
-            # 构建消息列表
-            full_messages = []
-            if system_prompt:
-                full_messages.append({"role": "system", "content": system_prompt})
-            full_messages.extend(messages)
-            
-            # 构建请求参数
-            params = {
-                "model": self.model,
-                "messages": full_messages,
-                "max_tokens": 4096
-            }
-            
-            # 添加工具定义
-            if tools:
-                params["tools"] = self._convert_tools_to_openai_format(tools)
-                params["tool_choice"] = "auto"
-            
-            response = self.client.chat.completions.create(**params)
-            
-            # 解析响应
-            result = {"content": "", "tool_calls": [], "raw_response": response}
-            
-            message = response.choices[0].message
-            result["content"] = message.content or ""
-            
-            if message.tool_calls:
-                for tool_call in message.tool_calls:
-                    result["tool_calls"].append({
-                        "name": tool_call.function.name,
-                        "arguments": json.loads(tool_call.function.arguments)
-                    })
+            response = self.client.chat.completions.create(**self._build_params(messages, system_prompt, tools))
+            return self._parse_response(response, include_raw)
             
-            return result
+        except Exception as e:
+            logger.error(f"OpenAI API 错误: {e}")
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+    
+    def chat_stream(self, messages: List[Dict], system_prompt: str = "") -> Iterator[str]:
+        if not self.client:
+            yield StreamError(self.NOT_INITIALIZED_ERROR)
+            return
+        
+        try:
+            # 调用方提前停止迭代时，with 语句关闭 HTTP 连接，服务端随之停止生成
+            with self.client.chat.completions.create(**self._build_params(messages, system_prompt, None), stream=True) as response:
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    
+        except Exception as e:
+            logger.error(f"OpenAI API 错误: {e}")
+            yield StreamError(f"API 错误: {e}")
+    
+    async def achat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+                    include_raw: bool = False) -> Dict:
+        if not self.aclient:
+            return self.NOT_INITIALIZED_REPLY
+        
+        try:
+            response = await self._get_aclient().chat.completions.create(**self._build_params(messages, system_prompt, tools))
+            return self._parse_response(response, include_raw)
             
         except Exception as e:
             logger.error(f"OpenAI API 错误: {e}")
-            return {"content": f"API 错误: {e}", "tool_calls": []}
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+    
+    def _build_params(self, messages: List[Dict], system_prompt: str, tools: List[Dict]) -> Dict:
+        """构建请求参数"""
+        messages, max_tokens = self._fit_context(messages, system_prompt)
+        
+        # 构建消息列表
+        # OpenAI 自动缓存请求的公共前缀（按位置匹配），因此系统提示词固定放在最前，
+        # 工具定义保持转换缓存中的顺序，动态内容只追加在后面
+        full_messages = _with_system(messages, system_prompt)
+        
+        params = {
+            "model": self.model,
+            "messages": full_messages,
+            "max_tokens": max_tokens
+        }
+        if self.temperature is not None:
+            params["temperature"] = self.temperature
+        
+        # 添加工具定义
+        if tools:
+            params["tools"] = _convert_tools_cached("openai", tools, self._convert_tools_to_openai_format)
+            params["tool_choice"] = "auto"
+        
+        return params
+    
+    def _parse_response(self, response, include_raw: bool = False) -> Dict:
+        """解析响应"""
+        result = {"content": "", "tool_calls": []}
+        
+        message = response.choices[0].message
+        result["content"] = message.content or ""
+        
+        if message.tool_calls:
+            for tool_call in message.tool_calls:
+                result["tool_calls"].append({
+                    "name": tool_call.function.name,
+                    "arguments": json_utils.loads(tool_call.function.arguments)
+                })
+        
+        if include_raw:
+            result["raw_response"] = response
+        
+        return result
     
     def _convert_tools_to_openai_format(self, tools: List[Dict]) -> List[Dict]:
         """转换工具格式为 OpenAI 格式"""
@@ -221,11 +811,7 @@ class ChatGPTProvider(AIProvider):
                 "function": {
                     "name": tool["name"],
                     "description": tool["description"],
-                    "parameters": {
-                        "type": "object",
-                        "properties": tool.get("parameters", {}),
-                        "required": [k for k, v in tool.get("parameters", {}).items() if v.get("required")]
-                    }
+                    "parameters": _input_schema(tool.get("parameters", {}))
                 }
             })
         return openai_tools
@@ -237,12 +823,24 @@ class ChatGPTProvider(AIProvider):
 class GeminiProvider(AIProvider):
     """Gemini (Google) 提供商"""
     
-    DEFAULT_MODEL = "gemini-pro"
+    __slots__ = ("genai", "gen_model", "_models")
+    
+    # 客户端未初始化时的回复
+    NOT_INITIALIZED_ERROR = "错误: Gemini API 客户端未初始化，请检查 API Key"
+    NOT_INITIALIZED_REPLY = {"content": NOT_INITIALIZED_ERROR, "tool_calls": (), "error": True}
+    
+    DEFAULT_MODEL = "gemini-1.5-flash"
+    SDK_MODULE = "google.generativeai"
+    CONTEXT_WINDOW = 1000000
+    
+    # 按系统提示词缓存的模型实例数量上限
+    MAX_CACHED_MODELS = 8
     
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, **kwargs):
-        super().__init__(api_key, model or self.DEFAULT_MODEL)
+        super().__init__(api_key, model or self.DEFAULT_MODEL, temperature=kwargs.get("temperature"))
         self.genai = None
         self.gen_model = None
+        self._models: Dict[str, Any] = {}
         
         self.api_key = api_key or os.environ.get("GOOGLE_API_KEY")
         
@@ -251,74 +849,111 @@ class GeminiProvider(AIProvider):
                 import google.generativeai as genai
                 genai.configure(api_key=self.api_key)
                 self.genai = genai
-                self.gen_model = genai.GenerativeModel(self.model)
+                self.gen_model = genai.GenerativeModel(self.model, generation_config=self._generation_config())
                 logger.info(f"Gemini 客户端初始化成功，模型: {self.model}")
             except ImportError:
                 logger.warning("google-generativeai 库未安装，运行: pip install google-generativeai")
             except Exception as e:
                 logger.error(f"Gemini 客户端初始化失败: {e}")
     
-    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None) -> Dict:
+    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+             include_raw: bool = False) -> Dict:
         if not self.gen_model:
-            return {"content": "错误: Gemini API 客户端未初始化，请检查 API Key", "tool_calls": []}
+            return self.NOT_INITIALIZED_REPLY
         
         try:
-            # 转换消息格式为 Gemini 格式
-            gemini_messages = []
-            for msg in messages:
-                role = "user" if msg["role"] == "user" else "model"
-                gemini_messages.append({
-                    "role": role,
-                    "parts": [msg["content"]]
-                })
+            history, content = self._convert_messages(messages, system_prompt)
             
-            # 如果有系统提示，添加到第一条用户消息
-            if system_prompt and gemini_messages:
-                gemini_messages[0]["parts"].insert(0, f"[系统指令]: {system_prompt}\n\n")
+            chat = self._get_model(system_prompt).start_chat(history=history)
+            response = retry_call(chat.send_message, content)
             
-            chat = self.gen_model.start_chat(history=gemini_messages[:-1] if len(gemini_messages) > 1 else [])
-            response = chat.send_message(gemini_messages[-1]["parts"][0] if gemini_messages else "")
+            return self._parse_response(response, include_raw)
             
-            # 解析响应
-            result = {"content": response.text, "tool_calls": [], "raw_response": response}
+        except Exception as e:
+            logger.error(f"Gemini API 错误: {e}")
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+    
+    def chat_stream(self, messages: List[Dict], system_prompt: str = "") -> Iterator[str]:
+        if not self.gen_model:
+            yield StreamError(self.NOT_INITIALIZED_ERROR)
+            return
+        
+        try:
+            history, content = self._convert_messages(messages, system_prompt)
+            
+            chat = self._get_model(system_prompt).start_chat(history=history)
+            response = chat.send_message(content, stream=True)
+            for chunk in response:
+                yield chunk.text
+                
+        except Exception as e:
+            logger.error(f"Gemini API 错误: {e}")
+            yield StreamError(f"API 错误: {e}")
+    
+    async def achat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+                    include_raw: bool = False) -> Dict:
+        if not self.gen_model:
+            return self.NOT_INITIALIZED_REPLY
+        
+        try:
+            history, content = self._convert_messages(messages, system_prompt)
             
-            # 尝试从响应中提取工具调用（Gemini 的 function calling）
-            result["tool_calls"] = self._extract_tool_calls(response.text)
+            chat = self._get_model(system_prompt).start_chat(history=history)
+            response = await aretry_call(chat.send_message_async, content)
             
-            return result
+            return self._parse_response(response, include_raw)
             
         except Exception as e:
             logger.error(f"Gemini API 错误: {e}")
-            return {"content": f"API 错误: {e}", "tool_calls": []}
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
     
-    def _extract_tool_calls(self, text: str) -> List[Dict]:
-        """从文本中提取工具调用（解析 JSON 块）"""
-        import re
-        tool_calls = []
+    def _generation_config(self) -> Optional[Dict]:
+        """生成参数（未设置温度时使用默认值）"""
+        return None if self.temperature is None else {"temperature": self.temperature}
+    
+    def _get_model(self, system_prompt: str):
+        """获取以 system_prompt 为系统指令的模型实例（按系统提示词缓存）"""
+        if not system_prompt:
+            return self.gen_model
         
-        # 查找 JSON 代码块
-        json_pattern = r'```json\s*(.*?)\s*```'
-        matches = re.findall(json_pattern, text, re.DOTALL)
+        model = self._models.get(system_prompt)
+        if model is None:
+            if len(self._models) >= self.MAX_CACHED_MODELS:
+                self._models.clear()
+            model = self.genai.GenerativeModel(self.model, system_instruction=system_prompt,
+                                               generation_config=self._generation_config())
+            self._models[system_prompt] = model
         
-        for match in matches:
-            try:
-                data = json.loads(match)
-                if isinstance(data, dict) and "action" in data:
-                    if data["action"] == "tool_call":
-                        tool_calls.append({
-                            "name": data.get("tool"),
-                            "arguments": data.get("parameters", {})
-                        })
-                    elif data["action"] == "multi_step":
-                        for step in data.get("steps", []):
-                            tool_calls.append({
-                                "name": step.get("tool"),
-                                "arguments": step.get("parameters", {})
-                            })
-            except json.JSONDecodeError:
-                pass
-        
-        return tool_calls
+        return model
+    
+    def _convert_messages(self, messages: List[Dict], system_prompt: str) -> tuple:
+        """
+        转换消息格式为 Gemini 原生格式
+        
+        Returns:
+            (历史消息列表, 最后一条消息的内容)
+        """
+        messages, _ = self._fit_context(messages, system_prompt)
+        
+        history = [
+            {"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]}
+            for msg in messages[:-1]
+        ]
+        content = messages[-1]["content"] if messages else ""
+        
+        return history, content
+    
+    def _parse_response(self, response, include_raw: bool = False) -> Dict:
+        """解析响应"""
+        result = {"content": response.text, "tool_calls": []}
+        
+        # 尝试从响应中提取工具调用（Gemini 的 function calling）
+        result["tool_calls"] = self._extract_tool_calls(response.text)
+        
+        if include_raw:
+            result["raw_response"] = response
+        
+        return result
     
     def is_available(self) -> bool:
         return self.gen_model is not None
@@ -327,171 +962,429 @@ class GeminiProvider(AIProvider):
 class OllamaProvider(AIProvider):
     """Ollama 本地模型提供商"""
     
+    __slots__ = ("_session",)
+    
     DEFAULT_MODEL = "llama3"
+    SDK_MODULE = "requests"
+    CONTEXT_WINDOW = 8192
     DEFAULT_URL = "http://localhost:11434"
+    JSON_HEADERS = {"Content-Type": "application/json"}
+    
+    # 常见错误的回复
+    CONNECTION_ERROR = "错误: 无法连接到 Ollama 服务，请确保 Ollama 正在运行\n运行: ollama serve"
+    REQUESTS_MISSING_ERROR = "错误: requests 库未安装，运行: pip install requests"
+    CONNECTION_REPLY = {"content": CONNECTION_ERROR, "tool_calls": (), "error": True}
+    REQUESTS_MISSING_REPLY = {"content": REQUESTS_MISSING_ERROR, "tool_calls": (), "error": True}
+    
+    # 本地模型吞吐有限，并发数应远低于云端 API
+    MAX_CONCURRENCY = 50
+    
+    # 未配置温度时使用的采样温度
+    OLLAMA_DEFAULT_TEMPERATURE = 0.7
+    
+    # 服务繁忙（HTTP 503）时的重试次数
+    BUSY_RETRIES = 3
+    
+    # 可用性探测的连接超时与探测结果的缓存时间（秒）
+    PROBE_TIMEOUT = 0.5
+    UNAVAILABLE_TTL = 30
+    AVAILABLE_TTL = 300
+    
+    # base_url → (是否可用, 探测时间)，进程内所有实例共享
+    _probe_results: Dict[str, Tuple[bool, float]] = {}
     
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, 
                  base_url: Optional[str] = None, **kwargs):
-        super().__init__(api_key, model or self.DEFAULT_MODEL, base_url or self.DEFAULT_URL)
-        self._available = None
+        super().__init__(api_key, model or self.DEFAULT_MODEL, base_url or self.DEFAULT_URL, kwargs.get("temperature"))
+        self._session = None
     
-    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None) -> Dict:
-        try:
+    def _get_session(self):
+        """获取复用 TCP 连接的 HTTP 会话（首次使用时创建）"""
+        if self._session is None:
             import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
             
-            # 构建消息
-            full_messages = []
-            if system_prompt:
-                full_messages.append({"role": "system", "content": system_prompt})
-            full_messages.extend(messages)
+            # Ollama 请求队列已满时返回 503，按 Retry-After 或指数退避重试；
+            # 连接失败说明服务未启动，不重试，直接返回错误
+            retries = Retry(total=self.BUSY_RETRIES, connect=0, read=0, status=self.BUSY_RETRIES,
+                            status_forcelist=(503,), allowed_methods=None, backoff_factor=1,
+                            raise_on_status=False)
             
-            # 发送请求
-            response = requests.post(
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retries)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            
+            self._session = session
+            atexit.register(session.close)
+        
+        return self._session
+    
+    def close(self):
+        """关闭 HTTP 会话"""
+        if self._session is not None:
+            atexit.unregister(self._session.close)
+            self._session.close()
+            self._session = None
+    
+    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+             include_raw: bool = False) -> Dict:
+        try:
+            import requests
+        except ImportError:
+            return self.REQUESTS_MISSING_REPLY
+        
+        try:
+            # 以流式请求接收，超时按相邻两块数据的间隔计算，长回复不会因总耗时超时
+            with self._get_session().post(
                 f"{self.base_url}/api/chat",
-                json={
-                    "model": self.model,
-                    "messages": full_messages,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "num_predict": 4096
-                    }
-                },
+                data=json_utils.dumps_bytes(self._build_payload(messages, system_prompt)),
+                headers=self.JSON_HEADERS,
+                stream=True,
                 timeout=120
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                content = data.get("message", {}).get("content", "")
+            ) as response:
+                if response.status_code != 200:
+                    return {"content": f"Ollama 错误: HTTP {response.status_code}", "tool_calls": [], "error": True}
                 
-                result = {"content": content, "tool_calls": [], "raw_response": data}
+                parts = []
+                data = {}
+                for line in response.iter_lines():
+                    if line:
+                        data = self._add_chunk(parts, line)
+                        if data.get("done"):
+                            break
                 
-                # 尝试提取工具调用
-                result["tool_calls"] = self._extract_tool_calls(content)
+                return self._parse_response(self._merge_chunks(parts, data), include_raw)
                 
-                return result
-            else:
-                return {"content": f"Ollama 错误: HTTP {response.status_code}", "tool_calls": []}
+        except requests.exceptions.ConnectionError:
+            self._mark_unavailable()
+            return self.CONNECTION_REPLY
+        except Exception as e:
+            logger.error(f"Ollama 错误: {e}")
+            return {"content": f"错误: {e}", "tool_calls": [], "error": True}
+    
+    def chat_stream(self, messages: List[Dict], system_prompt: str = "") -> Iterator[str]:
+        try:
+            import requests
+        except ImportError:
+            yield StreamError(self.REQUESTS_MISSING_ERROR)
+            return
+        
+        try:
+            payload = self._build_payload(messages, system_prompt)
+            
+            with self._get_session().post(f"{self.base_url}/api/chat", data=json_utils.dumps_bytes(payload),
+                                          headers=self.JSON_HEADERS, stream=True, timeout=120) as response:
+                if response.status_code != 200:
+                    yield StreamError(f"Ollama 错误: HTTP {response.status_code}")
+                    return
                 
+                # Ollama 流式接口每行返回一个 JSON 对象
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json_utils.loads(line)
+                    content = data.get("message", {}).get("content", "")
+                    if content:
+                        yield content
+                    if data.get("done"):
+                        break
+                        
         except requests.exceptions.ConnectionError:
-            return {"content": "错误: 无法连接到 Ollama 服务，请确保 Ollama 正在运行\n运行: ollama serve", "tool_calls": []}
+            self._mark_unavailable()
+            yield StreamError(self.CONNECTION_ERROR)
         except Exception as e:
             logger.error(f"Ollama 错误: {e}")
-            return {"content": f"错误: {e}", "tool_calls": []}
+            yield StreamError(f"错误: {e}")
     
-    def _extract_tool_calls(self, text: str) -> List[Dict]:
-        """从文本中提取工具调用"""
-        import re
-        tool_calls = []
+    async def astream(self, messages: List[Dict], system_prompt: str = "") -> AsyncIterator[str]:
+        http_client = get_async_http_client()
+        if http_client is None:
+            # 未安装 httpx 时退回线程池读取同步流
+            async for chunk in super().astream(messages, system_prompt):
+                yield chunk
+            return
         
-        json_pattern = r'```json\s*(.*?)\s*```'
-        matches = re.findall(json_pattern, text, re.DOTALL)
+        import httpx
         
-        for match in matches:
-            try:
-                data = json.loads(match)
-                if isinstance(data, dict):
-                    if data.get("action") == "tool_call":
-                        tool_calls.append({
-                            "name": data.get("tool"),
-                            "arguments": data.get("parameters", {})
-                        })
-                    elif data.get("action") == "multi_step":
-                        for step in data.get("steps", []):
-                            tool_calls.append({
-                                "name": step.get("tool"),
-                                "arguments": step.get("parameters", {})
-                            })
-            except json.JSONDecodeError:
-                pass
-        
-        return tool_calls
+        try:
+            async with http_client.stream(
+                "POST",
+                f"{self.base_url}/api/chat",
+                content=json_utils.dumps_bytes(self._build_payload(messages, system_prompt)),
+                headers=self.JSON_HEADERS,
+                timeout=120
+            ) as response:
+                if response.status_code != 200:
+                    yield StreamError(f"Ollama 错误: HTTP {response.status_code}")
+                    return
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json_utils.loads(line)
+                    content = data.get("message", {}).get("content", "")
+                    if content:
+                        yield content
+                    if data.get("done"):
+                        break
+        
+        except httpx.ConnectError:
+            self._mark_unavailable()
+            yield StreamError(self.CONNECTION_ERROR)
+        except Exception as e:
+            logger.error(f"Ollama 错误: {e}")
+            yield StreamError(f"错误: {e}")
+    
+    async def achat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+                    include_raw: bool = False) -> Dict:
+        http_client = get_async_http_client()
+        if http_client is None:
+            # 未安装 httpx 时退回线程池执行同步请求
+            return await super().achat(messages, system_prompt, tools, include_raw)
+        
+        import httpx
+        
+        try:
+            # 流式接收，任务被取消时连接随之关闭，Ollama 会停止生成
+            async with http_client.stream(
+                "POST",
+                f"{self.base_url}/api/chat",
+                content=json_utils.dumps_bytes(self._build_payload(messages, system_prompt)),
+                headers=self.JSON_HEADERS,
+                timeout=120
+            ) as response:
+                if response.status_code != 200:
+                    return {"content": f"Ollama 错误: HTTP {response.status_code}", "tool_calls": [], "error": True}
+                
+                parts = []
+                data = {}
+                async for line in response.aiter_lines():
+                    if line:
+                        data = self._add_chunk(parts, line)
+                        if data.get("done"):
+                            break
+                
+                return self._parse_response(self._merge_chunks(parts, data), include_raw)
+        
+        except httpx.ConnectError:
+            self._mark_unavailable()
+            return self.CONNECTION_REPLY
+        except Exception as e:
+            logger.error(f"Ollama 错误: {e}")
+            return {"content": f"错误: {e}", "tool_calls": [], "error": True}
+    
+    def _build_payload(self, messages: List[Dict], system_prompt: str) -> Dict:
+        """构建请求体"""
+        messages, max_tokens = self._fit_context(messages, system_prompt)
+        
+        full_messages = _with_system(messages, system_prompt)
+        
+        return {
+            "model": self.model,
+            "messages": full_messages,
+            "stream": True,
+            "options": {
+                "temperature": self.OLLAMA_DEFAULT_TEMPERATURE if self.temperature is None else self.temperature,
+                "num_predict": max_tokens
+            }
+        }
+    
+    @staticmethod
+    def _add_chunk(parts: List[str], line) -> Dict:
+        """解析流式响应的一行（一个 JSON 对象），把其中的内容片段追加到 parts"""
+        data = json_utils.loads(line)
+        content = data.get("message", {}).get("content", "")
+        if content:
+            parts.append(content)
+        return data
+    
+    @staticmethod
+    def _merge_chunks(parts: List[str], last: Dict) -> Dict:
+        """把流式响应合并为与非流式接口相同的结构（最后一块带有 done 和统计信息）"""
+        data = dict(last)
+        data["message"] = {"role": "assistant", "content": "".join(parts)}
+        return data
+    
+    def _parse_response(self, data: Dict, include_raw: bool = False) -> Dict:
+        """解析响应"""
+        content = data.get("message", {}).get("content", "")
+        
+        result = {"content": content, "tool_calls": []}
+        
+        # 尝试提取工具调用
+        result["tool_calls"] = self._extract_tool_calls(content)
+        
+        if include_raw:
+            result["raw_response"] = data
+        
+        return result
+    
+    def _cached_probe(self) -> Optional[bool]:
+        """返回仍在有效期内的探测结果，没有时返回 None"""
+        cached = self._probe_results.get(self.base_url)
+        if cached is None:
+            return None
+        
+        available, probed_at = cached
+        ttl = self.AVAILABLE_TTL if available else self.UNAVAILABLE_TTL
+        return available if time.monotonic() - probed_at < ttl else None
+    
+    def _mark_unavailable(self):
+        """请求时连接失败，说明 Ollama 已停止，作废之前"可用"的探测结果"""
+        self._probe_results[self.base_url] = (False, time.monotonic())
     
     def is_available(self) -> bool:
-        if self._available is not None:
-            return self._available
+        # 探测结果按 TTL 缓存，Ollama 重启或停止后会在过期时重新探测
+        cached = self._cached_probe()
+        if cached is not None:
+            return cached
         
         try:
-            import requests
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            self._available = response.status_code == 200
-        except:
-            self._available = False
+            response = self._get_session().get(f"{self.base_url}/api/tags", 
+                                               timeout=(self.PROBE_TIMEOUT, 5))
+            available = response.status_code == 200
+        except Exception:
+            available = False
+        
+        self._probe_results[self.base_url] = (available, time.monotonic())
+        return available
+    
+    async def ais_available(self) -> bool:
+        """is_available 的异步版本，探测时不阻塞事件循环"""
+        cached = self._cached_probe()
+        if cached is not None:
+            return cached
+        
+        import asyncio
+        
+        http_client = get_async_http_client()
+        if http_client is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self.is_available)
+        
+        import httpx
+        
+        try:
+            response = await http_client.get(f"{self.base_url}/api/tags",
+                                             timeout=httpx.Timeout(5, connect=self.PROBE_TIMEOUT))
+            available = response.status_code == 200
+        except Exception:
+            available = False
         
-        return self._available
+        self._probe_results[self.base_url] = (available, time.monotonic())
+        return available
 
 
 class DeepSeekProvider(AIProvider):
     """DeepSeek 提供商（兼容 OpenAI 接口）"""
     
+    __slots__ = ("client", "aclient")
+    
+    # 客户端未初始化时的回复
+    NOT_INITIALIZED_ERROR = "错误: DeepSeek API 客户端未初始化，请检查 API Key"
+    NOT_INITIALIZED_REPLY = {"content": NOT_INITIALIZED_ERROR, "tool_calls": (), "error": True}
+    
     DEFAULT_MODEL = "deepseek-chat"
+    SDK_MODULE = "openai"
+    CONTEXT_WINDOW = 64000
     DEFAULT_URL = "https://api.deepseek.com"
     
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, 
                  base_url: Optional[str] = None, **kwargs):
-        super().__init__(api_key, model or self.DEFAULT_MODEL, base_url or self.DEFAULT_URL)
+        super().__init__(api_key, model or self.DEFAULT_MODEL, base_url or self.DEFAULT_URL, kwargs.get("temperature"))
         self.client = None
+        self.aclient = None
         
         self.api_key = api_key or os.environ.get("DEEPSEEK_API_KEY")
         
         if self.api_key:
             try:
-                from openai import OpenAI
-                self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+                from openai import OpenAI, AsyncOpenAI
+                self.client = _shared_client(
+                    ("OpenAI", self.api_key, self.base_url),
+                    lambda: OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=SDK_MAX_RETRIES,
+                                   http_client=get_http_client())
+                )
+                self.aclient = _shared_client(
+                    ("AsyncOpenAI", self.api_key, self.base_url),
+                    lambda: AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=SDK_MAX_RETRIES)
+                )
                 logger.info(f"DeepSeek 客户端初始化成功，模型: {self.model}")
             except ImportError:
                 logger.warning("openai 库未安装，运行: pip install openai")
             except Exception as e:
                 logger.error(f"DeepSeek 客户端初始化失败: {e}")
     
-    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None) -> Dict:
+    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+             include_raw: bool = False) -> Dict:
         if not self.client:
-            return {"content": "错误: DeepSeek API 客户端未初始化，请检查 API Key", "tool_calls": []}
+            return self.NOT_INITIALIZED_REPLY
         
         try:
-            full_messages = []
-            if system_prompt:
-                full_messages.append({"role": "system", "content": system_prompt})
-            full_messages.extend(messages)
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=full_messages,
-                max_tokens=4096
-            )
+            response = self.client.chat.completions.create(**self._build_params(messages, system_prompt))
+            return self._parse_response(response, include_raw)
             
-            content = response.choices[0].message.content or ""
-            result = {"content": content, "tool_calls": [], "raw_response": response}
-            
-            # 提取工具调用
-            result["tool_calls"] = self._extract_tool_calls(content)
-            
-            return result
+        except Exception as e:
+            logger.error(f"DeepSeek API 错误: {e}")
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+    
+    def chat_stream(self, messages: List[Dict], system_prompt: str = "") -> Iterator[str]:
+        if not self.client:
+            yield StreamError(self.NOT_INITIALIZED_ERROR)
+            return
+        
+        try:
+            # 调用方提前停止迭代时，with 语句关闭 HTTP 连接，服务端随之停止生成
+            with self.client.chat.completions.create(**self._build_params(messages, system_prompt), stream=True) as response:
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    
+        except Exception as e:
+            logger.error(f"DeepSeek API 错误: {e}")
+            yield StreamError(f"API 错误: {e}")
+    
+    async def achat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+                    include_raw: bool = False) -> Dict:
+        if not self.aclient:
+            return self.NOT_INITIALIZED_REPLY
+        
+        try:
+            response = await self._get_aclient().chat.completions.create(**self._build_params(messages, system_prompt))
+            return self._parse_response(response, include_raw)
             
         except Exception as e:
             logger.error(f"DeepSeek API 错误: {e}")
-            return {"content": f"API 错误: {e}", "tool_calls": []}
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
     
-    def _extract_tool_calls(self, text: str) -> List[Dict]:
-        """从文本中提取工具调用"""
-        import re
-        tool_calls = []
+    def _build_params(self, messages: List[Dict], system_prompt: str) -> Dict:
+        """构建请求参数"""
+        messages, max_tokens = self._fit_context(messages, system_prompt)
         
-        json_pattern = r'```json\s*(.*?)\s*```'
-        matches = re.findall(json_pattern, text, re.DOTALL)
+        full_messages = _with_system(messages, system_prompt)
         
-        for match in matches:
-            try:
-                data = json.loads(match)
-                if isinstance(data, dict) and data.get("action") == "tool_call":
-                    tool_calls.append({
-                        "name": data.get("tool"),
-                        "arguments": data.get("parameters", {})
-                    })
-            except json.JSONDecodeError:
-                pass
+        params = {
+            "model": self.model,
+            "messages": full_messages,
+            "max_tokens": max_tokens
+        }
+        if self.temperature is not None:
+            params["temperature"] = self.temperature
+        return params
+    
+    def _parse_response(self, response, include_raw: bool = False) -> Dict:
+        """解析响应"""
+        content = response.choices[0].message.content or ""
+        result = {"content": content, "tool_calls": []}
+        
+        # 提取工具调用
+        result["tool_calls"] = self._extract_tool_calls(content)
         
-        return tool_calls
+        if include_raw:
+            result["raw_response"] = response
+        
+        return result
     
     def is_available(self) -> bool:
         return self.client is not None
@@ -500,40 +1393,96 @@ class DeepSeekProvider(AIProvider):
 class CustomOpenAIProvider(AIProvider):
     """自定义 OpenAI 兼容接口提供商"""
     
+    __slots__ = ("client", "aclient")
+    
+    # 客户端未初始化时的回复
+    NOT_INITIALIZED_ERROR = "错误: 自定义 API 客户端未初始化"
+    NOT_INITIALIZED_REPLY = {"content": NOT_INITIALIZED_ERROR, "tool_calls": (), "error": True}
+    
+    SDK_MODULE = "openai"
+    
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None,
                  base_url: Optional[str] = None, **kwargs):
-        super().__init__(api_key, model or "gpt-3.5-turbo", base_url)
+        super().__init__(api_key, model or "gpt-3.5-turbo", base_url, kwargs.get("temperature"))
         self.client = None
+        self.aclient = None
         
         if self.api_key and self.base_url:
             try:
-                from openai import OpenAI
-                self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+                from openai import OpenAI, AsyncOpenAI
+                self.client = _shared_client(
+                    ("OpenAI", self.api_key, self.base_url),
+                    lambda: OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=SDK_MAX_RETRIES,
+                                   http_client=get_http_client())
+                )
+                self.aclient = _shared_client(
+                    ("AsyncOpenAI", self.api_key, self.base_url),
+                    lambda: AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=SDK_MAX_RETRIES)
+                )
                 logger.info(f"自定义 OpenAI 客户端初始化成功: {self.base_url}")
             except Exception as e:
                 logger.error(f"自定义 OpenAI 客户端初始化失败: {e}")
     
-    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None) -> Dict:
+    def chat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+             include_raw: bool = False) -> Dict:
         if not self.client:
-            return {"content": "错误: 自定义 API 客户端未初始化", "tool_calls": []}
+            return self.NOT_INITIALIZED_REPLY
         
         try:
-            full_messages = []
-            if system_prompt:
-                full_messages.append({"role": "system", "content": system_prompt})
-            full_messages.extend(messages)
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=full_messages,
-                max_tokens=4096
-            )
+            response = self.client.chat.completions.create(**self._build_params(messages, system_prompt))
+            return self._parse_response(response, include_raw)
             
-            content = response.choices[0].message.content or ""
-            return {"content": content, "tool_calls": [], "raw_response": response}
+        except Exception as e:
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+    
+    def chat_stream(self, messages: List[Dict], system_prompt: str = "") -> Iterator[str]:
+        if not self.client:
+            yield StreamError(self.NOT_INITIALIZED_ERROR)
+            return
+        
+        try:
+            # 调用方提前停止迭代时，with 语句关闭 HTTP 连接，服务端随之停止生成
+            with self.client.chat.completions.create(**self._build_params(messages, system_prompt), stream=True) as response:
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    
+        except Exception as e:
+            yield StreamError(f"API 错误: {e}")
+    
+    async def achat(self, messages: List[Dict], system_prompt: str = "", tools: List[Dict] = None,
+                    include_raw: bool = False) -> Dict:
+        if not self.aclient:
+            return self.NOT_INITIALIZED_REPLY
+        
+        try:
+            response = await self._get_aclient().chat.completions.create(**self._build_params(messages, system_prompt))
+            return self._parse_response(response, include_raw)
             
         except Exception as e:
-            return {"content": f"API 错误: {e}", "tool_calls": []}
+            return {"content": f"API 错误: {e}", "tool_calls": [], "error": True}
+    
+    def _parse_response(self, response, include_raw: bool = False) -> Dict:
+        """解析响应"""
+        result = {"content": response.choices[0].message.content or "", "tool_calls": []}
+        if include_raw:
+            result["raw_response"] = response
+        return result
+    
+    def _build_params(self, messages: List[Dict], system_prompt: str) -> Dict:
+        """构建请求参数"""
+        messages, max_tokens = self._fit_context(messages, system_prompt)
+        
+        full_messages = _with_system(messages, system_prompt)
+        
+        params = {
+            "model": self.model,
+            "messages": full_messages,
+            "max_tokens": max_tokens
+        }
+        if self.temperature is not None:
+            params["temperature"] = self.temperature
+        return params
     
     def is_available(self) -> bool:
         return self.client is not None
@@ -544,21 +1493,31 @@ class CustomOpenAIProvider(AIProvider):
 class AIProviderFactory:
     """AI 提供商工厂"""
     
-    _providers = {
+    # 提供商名称（小写）→ 提供商类
+    # 只读映射，register_provider 整体替换而不原地修改，create() 读取时无需加锁
+    _providers = MappingProxyType({
         "claude": ClaudeProvider,
         "chatgpt": ChatGPTProvider,
-        "openai": ChatGPTProvider,
         "gemini": GeminiProvider,
-        "google": GeminiProvider,
         "ollama": OllamaProvider,
-        "local": OllamaProvider,
         "deepseek": DeepSeekProvider,
         "custom": CustomOpenAIProvider
-    }
+    })
+    
+    # 别名 → 提供商名称
+    _aliases = MappingProxyType({
+        "anthropic": "claude",
+        "openai": "chatgpt",
+        "gpt": "chatgpt",
+        "google": "gemini",
+        "local": "ollama"
+    })
+    
+    _register_lock = threading.Lock()
     
     @classmethod
     def create(cls, provider_name: str, api_key: Optional[str] = None, 
-               model: Optional[str] = None, **kwargs) -> AIProvider:
+               model: Optional[str] = None, cache=None, semantic_cache=None, **kwargs) -> AIProvider:
         """
         创建 AI 提供商实例
         
@@ -566,32 +1525,85 @@ class AIProviderFactory:
             provider_name: 提供商名称 (claude/chatgpt/gemini/ollama/deepseek/custom)
             api_key: API 密钥
             model: 模型名称
-            **kwargs: 其他参数（如 base_url）
+            cache: 响应缓存 ResponseCache（可选）
+            semantic_cache: 语义缓存 SemanticCache（可选，需同时提供 cache；只在温度为 0 时使用）
+            **kwargs: 其他参数（如 base_url、temperature）
         
         Returns:
             AIProvider 实例
         """
-        provider_name = provider_name.lower()
-        provider_class = cls._providers.get(provider_name)
+        provider_class = cls._lookup(provider_name)
         
         if not provider_class:
-            logger.warning(f"未知提供商 '{provider_name}'，可用: {list(cls._providers.keys())}")
+            logger.warning(f"未知提供商 '{provider_name}'，可用: {cls.list_providers()}")
             # 默认使用 Ollama
             provider_class = OllamaProvider
         
+        # 不在此处检查 is_available()（Ollama 需要一次 HTTP 探测），
+        # 提供商不可用时由首次 chat() 返回错误信息
         provider = provider_class(api_key=api_key, model=model, **kwargs)
         
-        if not provider.is_available():
-            logger.warning(f"{provider_name} 不可用，请检查配置")
+        # 温度不为 0 时每次回复都是重新采样的，缓存会让回复在 TTL 内固定不变
+        if cache is not None and not provider.deterministic:
+            logger.debug(f"{provider_name} 的温度不为 0，不缓存响应")
+        elif cache is not None:
+            from src.ai_providers.cache import CachedProvider
+            provider = CachedProvider(provider, cache, semantic_cache)
         
         return provider
     
+    @classmethod
+    def _lookup(cls, name: str) -> Optional[type]:
+        """按名称或别名查找提供商类（不区分大小写）"""
+        provider_class = cls._providers.get(cls._aliases.get(name, name))
+        if provider_class is None and not name.islower():
+            name = name.lower()
+            provider_class = cls._providers.get(cls._aliases.get(name, name))
+        return provider_class
+    
+    @classmethod
+    def warmup(cls, provider_name: str):
+        """
+        预先导入提供商依赖的 SDK 模块
+        
+        SDK 导入耗时较长（数百毫秒），可在后台线程中提前执行；
+        之后 create() 中的导入会等待预热完成并直接复用已导入的模块
+        """
+        provider_class = cls._lookup(provider_name)
+        if provider_class is None or not provider_class.SDK_MODULE:
+            return
+        
+        try:
+            importlib.import_module(provider_class.SDK_MODULE)
+        except Exception as e:
+            logger.debug(f"预热导入 {provider_class.SDK_MODULE} 失败: {e}")
+    
+    @classmethod
+    def close_all(cls):
+        """关闭并清空缓存的 SDK 客户端（异步客户端随事件循环释放，只清除引用）"""
+        with _client_lock:
+            clients = list(_client_cache.items())
+            _client_cache.clear()
+        
+        for (name, _, _), client in clients:
+            if not name.startswith("Async"):
+                try:
+                    client.close()
+                except Exception as e:
+                    logger.debug(f"关闭 {name} 客户端失败: {e}")
+    
+    @classmethod
+    async def aclose(cls):
+        """关闭当前事件循环的共享异步连接池（在 chat_batch 等异步调用结束后调用）"""
+        await aclose_async_http_client()
+    
     @classmethod
     def list_providers(cls) -> List[str]:
-        """列出所有支持的提供商"""
-        return list(set(cls._providers.keys()))
+        """列出所有支持的提供商（不含别名）"""
+        return list(cls._providers.keys())
     
     @classmethod
     def register_provider(cls, name: str, provider_class: type):
         """注册自定义提供商"""
-        cls._providers[name.lower()] = provider_class
+        with cls._register_lock:
+            cls._providers = MappingProxyType({**cls._providers, name.lower(): provider_class})
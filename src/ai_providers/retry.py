@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Retry - API 请求重试
+对限流（429）、服务端错误（5xx）和网络超时等瞬时错误进行指数退避重试
+
+anthropic / openai SDK 自带重试（同样遵循 Retry-After），这些提供商在创建客户端时
+传入 max_retries=SDK_MAX_RETRIES 即可，不再在外层叠加 retry_call；
+retry_call 用于没有内置重试的 SDK（如 google-generativeai）。
+
+用法:
+    response = retry_call(chat.send_message, content)
+    response = await aretry_call(chat.send_message_async, content)
+
+不可恢复的错误（如 401 认证失败、400 参数错误）会立即抛出，
+重试次数用尽后抛出最后一次的异常，由调用方转换为用户可见的错误信息。
+"""
+
+from typing import Any, Callable, Optional
+import random
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 最大尝试次数（含首次请求）
+MAX_ATTEMPTS = 5
+
+# 交给 SDK 内置重试时的重试次数（不含首次请求）
+SDK_MAX_RETRIES = MAX_ATTEMPTS - 1
+
+# 退避等待时间（秒）
+INITIAL_WAIT = 1.0
+MAX_WAIT = 30.0
+
+# 可重试的 HTTP 状态码
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# 可重试的异常类型名（各 SDK 的连接/超时错误，按名称匹配以避免导入 SDK）
+RETRY_EXCEPTION_NAMES = {
+    "APIConnectionError",     # anthropic / openai
+    "APITimeoutError",        # anthropic / openai
+    "Timeout",                # requests
+    "ReadTimeout",            # requests / httpx
+    "ConnectTimeout",         # requests / httpx
+    "ResourceExhausted",      # google.api_core (429)
+    "ServiceUnavailable",     # google.api_core (503)
+    "DeadlineExceeded",       # google.api_core (504)
+    "InternalServerError",    # google.api_core (500)
+}
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    """从异常中提取 HTTP 状态码"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(exc: Exception) -> bool:
+    """判断异常是否为可重试的瞬时错误"""
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRY_STATUS_CODES
+    
+    return any(cls.__name__ in RETRY_EXCEPTION_NAMES for cls in type(exc).__mro__)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """读取响应头中的 Retry-After（秒）"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    
+    try:
+        value = headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _wait_time(attempt: int, exc: Exception) -> float:
+    """计算第 attempt 次失败后的等待时间"""
+    retry_after = _retry_after(exc)
+    if retry_after is not None:
+        return min(retry_after, MAX_WAIT)
+    
+    # 指数退避 + 随机抖动，避免多个请求同时重试
+    wait = min(INITIAL_WAIT * (2 ** (attempt - 1)), MAX_WAIT)
+    return wait + random.uniform(0, wait / 2)
+
+
+def retry_call(func: Callable, *args, **kwargs) -> Any:
+    """
+    调用 func，遇到瞬时错误时退避重试
+    
+    Args:
+        func: 要调用的函数
+        *args, **kwargs: 传给 func 的参数
+    
+    Returns:
+        func 的返回值
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= MAX_ATTEMPTS or not is_transient(e):
+                raise
+            
+            wait = _wait_time(attempt, e)
+            logger.warning(f"API 请求失败（第 {attempt} 次），{wait:.1f} 秒后重试: {e}")
+            time.sleep(wait)
+
+
+async def aretry_call(func: Callable, *args, **kwargs) -> Any:
+    """
+    retry_call 的异步版本，func 应返回 awaitable
+    """
+    import asyncio
+    
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= MAX_ATTEMPTS or not is_transient(e):
+                raise
+            
+            wait = _wait_time(attempt, e)
+            logger.warning(f"API 请求失败（第 {attempt} 次），{wait:.1f} 秒后重试: {e}")
+            await asyncio.sleep(wait)
@@ -13,17 +13,63 @@ Arixa Client - 客户端核心模块
 7. 输出最终结果给用户
 """
 
-import json
 import os
 import sys
 import asyncio
-from typing import Dict, Any, List, Optional
+import itertools
+import time
+from typing import Dict, Any, List, Optional, Callable, NamedTuple, Tuple
 import logging
-import re
+
+from src.utils import json_utils
 
 logger = logging.getLogger(__name__)
 
 
+class ToolResult(NamedTuple):
+    """工具执行结果"""
+    success: bool
+    data: Any = None             # 工具返回的完整结果（反馈给 AI）
+    error: Optional[str] = None
+    
+    @classmethod
+    def from_response(cls, result: Any) -> "ToolResult":
+        """由工具处理函数的返回值构建"""
+        if not isinstance(result, dict):
+            return cls(True, result)
+        return cls(bool(result.get("success", False)), result, result.get("error"))
+    
+    def payload(self) -> Any:
+        """反馈给 AI 的内容"""
+        if self.data is not None:
+            return self.data
+        return {"success": self.success, "error": self.error}
+
+
+class StreamWriter:
+    """
+    流式输出回调：把 AI 回复逐段写到终端
+    
+    不必每段都 flush（每次 flush 都是一次系统调用），遇到换行或距上次 flush
+    超过 FLUSH_INTERVAL 秒时才 flush，看起来仍是逐字输出
+    """
+    
+    __slots__ = ("stream", "_last_flush")
+    
+    FLUSH_INTERVAL = 0.05
+    
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._last_flush = 0.0
+    
+    def __call__(self, text: str):
+        self.stream.write(text)
+        now = time.monotonic()
+        if "\n" in text or now - self._last_flush >= self.FLUSH_INTERVAL:
+            self.stream.flush()
+            self._last_flush = now
+
+
 class ArixaClient:
     """
     Arixa 客户端 - AI 与本地程序的中介
@@ -34,6 +80,20 @@ class ArixaClient:
     - 管理对话上下文
     """
     
+    # 命令前缀：跳过响应缓存
+    NOCACHE_PREFIX = "@nocache"
+    
+    DEFAULT_MAX_HISTORY_TOKENS = 32000
+    
+    # 同时执行的只读工具调用数上限
+    DEFAULT_MAX_PARALLEL_TOOLS = 8
+    
+    # 流式输出时每收到多少段文本主动让出一次事件循环
+    STREAM_YIELD_EVERY = 32
+    
+    # 已注册程序路径检查结果的有效期（秒）
+    PROGRAM_CHECK_TTL = 30
+    
     def __init__(self, config, ai_provider: str = "claude", model: Optional[str] = None):
         """
         初始化客户端
@@ -47,12 +107,21 @@ class ArixaClient:
         self.ai_provider_name = ai_provider
         self.model = model
         self.conversation_history: List[Dict] = []
+        # 对话历史的 token 上限，每轮都会重新发送全部历史，超出时丢弃最早的对话（0 表示不限制）
+        self.max_history_tokens = config.get("ai.max_history_tokens", self.DEFAULT_MAX_HISTORY_TOKENS)
+        self.max_parallel_tools = config.get("max_parallel_tools", self.DEFAULT_MAX_PARALLEL_TOOLS)
         self.mcp_server = None
         self.ai = None
+        self.tool_selector = None
+        self._loop = None  # 执行工具调用的事件循环（首次使用时创建，之后一直复用）
+        self._system_prompt_cache: Dict[tuple, str] = {}  # 缓存键 → 系统提示词
+        self._path_checks: Dict[str, tuple] = {}  # 程序路径 → (是否存在, 检查时间)
+        self._request_ids = itertools.count(1)  # 本地 MCP 请求编号（id() 的地址会被复用，不能作为请求 ID）
         
         # 初始化组件
         self._init_mcp_server()
         self._init_ai_provider()
+        self._init_tool_selector()
         
     def _init_ai_provider(self):
         """初始化 AI 提供商"""
@@ -61,19 +130,41 @@ class ArixaClient:
         # 获取 API Key（优先从配置，其次从环境变量）
         api_key = self.config.get(f"ai.{self.ai_provider_name}.api_key")
         base_url = self.config.get(f"ai.{self.ai_provider_name}.base_url")
+        # 采样温度（未配置时使用提供商的默认值）；只有温度为 0 时才会缓存响应
+        temperature = self.config.get(f"ai.{self.ai_provider_name}.temperature")
+        
+        # 响应缓存（默认开启，可通过 ai.cache.enabled 关闭；温度不为 0 时提供商不会被包装，也就不创建缓存）
+        cache = None
+        semantic_cache = None
+        cache_config = self.config.get("ai.cache", {}) or {}
+        if cache_config.get("enabled", True) and temperature == 0:
+            from src.ai_providers.cache import ResponseCache, SemanticCache
+            cache = ResponseCache(
+                path=cache_config.get("path", ResponseCache.DEFAULT_PATH),
+                ttl=cache_config.get("ttl", 3600),
+                max_size_gb=cache_config.get("max_size_gb", 1.0)
+            )
+            
+            # 语义缓存（默认关闭，需要 sentence-transformers）
+            semantic_config = cache_config.get("semantic", {}) or {}
+            if semantic_config.get("enabled", False):
+                semantic_cache = SemanticCache(
+                    threshold=semantic_config.get("threshold", 0.92),
+                    model_name=semantic_config.get("model")
+                )
         
         # 创建 AI 提供商实例
         self.ai = AIProviderFactory.create(
             provider_name=self.ai_provider_name,
             api_key=api_key,
             model=self.model,
-            base_url=base_url
+            base_url=base_url,
+            temperature=temperature,
+            cache=cache,
+            semantic_cache=semantic_cache
         )
         
-        if self.ai.is_available():
-            logger.info(f"AI 提供商初始化成功: {self.ai_provider_name}")
-        else:
-            logger.warning(f"AI 提供商 {self.ai_provider_name} 不可用，请检查 API Key")
+        logger.info(f"AI 提供商已创建: {self.ai_provider_name}")
     
     def _init_mcp_server(self):
         """初始化本地 MCP 服务器实例"""
@@ -81,13 +172,60 @@ class ArixaClient:
         self.mcp_server = MCPServer(self.config)
         logger.info(f"MCP 服务器初始化完成，已注册 {len(self.mcp_server.tools)} 个工具")
     
-    def get_system_prompt(self) -> str:
+    def _init_tool_selector(self):
+        """初始化语义工具筛选（默认关闭，需要 sentence-transformers）"""
+        selection_config = self.config.get("ai.tool_selection", {}) or {}
+        if selection_config.get("enabled", False):
+            from src.client.tool_selector import ToolSelector
+            self.tool_selector = ToolSelector(
+                top_k=selection_config.get("top_k", 8),
+                threshold=selection_config.get("threshold", 0.3),
+                model_name=selection_config.get("model")
+            )
+            
+            # 在后台加载嵌入模型并建立工具索引，与等待用户输入同时进行
+            import threading
+            threading.Thread(
+                target=self.tool_selector.prepare,
+                args=(self.mcp_server.get_tools_for_ai(),),
+                daemon=True
+            ).start()
+    
+    # 最多缓存的系统提示词数（开启工具筛选时，不同的工具子集对应不同的提示词）
+    MAX_CACHED_PROMPTS = 32
+    
+    def get_system_prompt(self, tool_names: Optional[Tuple[str, ...]] = None) -> str:
+        """
+        获取系统提示词
+        
+        提示词只取决于列出的工具、已配置的程序和默认项目路径，
+        这些不变时复用之前生成的结果（相同的提示词也能命中提供商的提示词缓存）
+        
+        Args:
+            tool_names: 只列出这些工具（工具筛选的结果），None 表示列出全部工具
+        """
+        programs = self.config.get("programs", {}) or {}
+        key = (tuple(self.mcp_server.tools), tool_names, tuple(programs), 
+               self.config.get('default_project_path', '~/fpga_projects'))
+        
+        prompt = self._system_prompt_cache.get(key)
+        if prompt is None:
+            if len(self._system_prompt_cache) >= self.MAX_CACHED_PROMPTS:
+                self._system_prompt_cache.clear()
+            prompt = self._system_prompt_cache[key] = self._build_system_prompt(tool_names)
+        
+        return prompt
+    
+    def _build_system_prompt(self, tool_names: Optional[Tuple[str, ...]] = None) -> str:
         """
         生成系统提示词
         包含 AI 的角色定义和可用工具列表
         """
         # 获取工具列表
         tools_schema = self.mcp_server.get_tools_schema()
+        if tool_names is not None:
+            selected = set(tool_names)
+            tools_schema = [tool for tool in tools_schema if tool['name'] in selected]
         
         # 按类别分组工具
         tools_by_category = {}
@@ -98,14 +236,15 @@ class ArixaClient:
             tools_by_category[category].append(tool)
         
         # 构建工具描述
-        tools_desc = ""
+        parts = []
         for category, tools in tools_by_category.items():
-            tools_desc += f"\n### {category.upper()} 工具\n"
+            parts.append(f"\n### {category.upper()} 工具\n")
             for t in tools:
                 params_desc = ", ".join([f"{k}: {v.get('description', '')}" for k, v in t['parameters'].items()])
-                tools_desc += f"- **{t['name']}**: {t['description']}\n"
+                parts.append(f"- **{t['name']}**: {t['description']}\n")
                 if params_desc:
-                    tools_desc += f"  参数: {params_desc}\n"
+                    parts.append(f"  参数: {params_desc}\n")
+        tools_desc = "".join(parts)
         
         # 获取已注册程序
         programs = list(self.config.get("programs", {}).keys())
@@ -157,6 +296,9 @@ class ArixaClient:
 **纯文本回复（无需工具时）:**
 直接回复文本即可，不需要 JSON 格式。
 
+每次回复只包含一个 json 工具调用块，需要调用多个工具时使用 multi_step；
+该代码块之后的内容不会被处理，等收到工具执行结果后再继续下一步。
+
 ## 常用工作流示例
 
 1. **创建新项目**: vivado_create_project → 创建源文件 → vivado_add_sources → vivado_set_top
@@ -173,7 +315,23 @@ class ArixaClient:
 当前默认项目路径: {self.config.get('default_project_path', '~/fpga_projects')}
 """
 
-    def execute(self, user_input: str, max_iterations: int = 10) -> str:
+    def execute(self, user_input: str, max_iterations: int = 10,
+                on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """
+        执行用户命令（execute_async 的同步包装）
+        
+        Args:
+            user_input: 用户的自然语言输入
+            max_iterations: 最大迭代次数（防止无限循环）
+            on_delta: 流式输出回调（可选），设置后 AI 回复会边生成边回调
+        
+        Returns:
+            最终的响应文本
+        """
+        return self._run_async(self.execute_async(user_input, max_iterations, on_delta))
+    
+    async def execute_async(self, user_input: str, max_iterations: int = 10,
+                            on_delta: Optional[Callable[[str], None]] = None) -> str:
         """
         执行用户命令
         
@@ -187,34 +345,78 @@ class ArixaClient:
         Args:
             user_input: 用户的自然语言输入
             max_iterations: 最大迭代次数（防止无限循环）
+            on_delta: 流式输出回调（可选），设置后 AI 回复会边生成边回调
         
         Returns:
             最终的响应文本
         """
         logger.info(f"执行命令: {user_input}")
         
+        # 以 @nocache 开头的命令不读写响应缓存（如需要 AI 重新回答或包含敏感信息时）
+        ai = self.ai
+        if user_input.startswith(self.NOCACHE_PREFIX):
+            user_input = user_input[len(self.NOCACHE_PREFIX):].lstrip()
+            ai = self._uncached_ai()
+        
         # 添加用户消息到历史
         self.conversation_history.append({
             "role": "user",
             "content": user_input
         })
+        self._trim_history()
         
         final_response = ""
         iteration = 0
         
+        # 系统提示词和工具列表在一次执行中不会变化
+        tools = self.mcp_server.get_tools_for_ai()
+        tool_names = None
+        if self.tool_selector is not None:
+            # 计算嵌入向量（首次还可能等待后台加载模型）耗时较长，放到线程池中执行
+            all_tools = tools
+            tools = await asyncio.get_running_loop().run_in_executor(
+                None, self.tool_selector.select, user_input, all_tools
+            )
+            if tools is not all_tools:
+                # 系统提示词中也只列出选中的工具（多数提供商只通过提示词了解可用工具）
+                tool_names = tuple(tool["name"] for tool in tools)
+        system_prompt = self.get_system_prompt(tool_names)
+        
         while iteration < max_iterations:
             iteration += 1
             logger.debug(f"迭代 {iteration}")
             
             # 调用 AI
-            system_prompt = self.get_system_prompt()
-            tools = self.mcp_server.get_tools_for_ai()
-            
-            ai_response = self.ai.chat(
-                messages=self.conversation_history,
-                system_prompt=system_prompt,
-                tools=tools
-            )
+            if on_delta:
+                # 流式模式：边接收边输出，工具调用从文本中提取；
+                # 收到完整的工具调用块后立即关闭流，不再等待模型生成后续内容
+                from src.ai_providers.provider_factory import ToolCallWatcher
+                watcher = ToolCallWatcher()
+                stream = ai.astream(
+                    messages=self.conversation_history,
+                    system_prompt=system_prompt
+                )
+                try:
+                    count = 0
+                    async for chunk in stream:
+                        on_delta(chunk)
+                        if watcher.feed(chunk):
+                            break
+                        
+                        # 连接中已缓冲的数据可以连续读取而不挂起，定期让出事件循环，避免其他任务长时间得不到调度
+                        count += 1
+                        if count % self.STREAM_YIELD_EVERY == 0:
+                            await asyncio.sleep(0)
+                finally:
+                    await stream.aclose()
+                on_delta("\n")
+                ai_response = {"content": watcher.text, "tool_calls": watcher.tool_calls}
+            else:
+                ai_response = await ai.achat(
+                    messages=self.conversation_history,
+                    system_prompt=system_prompt,
+                    tools=tools
+                )
             
             content = ai_response.get("content", "")
             tool_calls = ai_response.get("tool_calls", [])
@@ -225,34 +427,25 @@ class ArixaClient:
             
             # 如果有工具调用，执行它们
             if tool_calls:
-                # 执行所有工具调用
-                tool_results = []
+                # 执行所有工具调用（相邻的只读工具并发执行）
                 for tool_call in tool_calls:
+                    print(f"🔧 执行: {tool_call.get('name')}")
+                    logger.info(f"调用工具: {tool_call.get('name')}, 参数: {tool_call.get('arguments', {})}")
+                
+                results = await self._call_tools_async(tool_calls)
+                
+                # 输出执行结果摘要，同时构建工具执行结果消息（紧凑 JSON，缩进只会增加发送给 AI 的 token 数）
+                parts = ["工具执行结果:\n"]
+                for tool_call, result in zip(tool_calls, results):
                     tool_name = tool_call.get("name")
-                    tool_args = tool_call.get("arguments", {})
-                    
-                    print(f"🔧 执行: {tool_name}")
-                    logger.info(f"调用工具: {tool_name}, 参数: {tool_args}")
+                    if result.success:
+                        print(f"   ✅ {tool_name} 成功")
+                    else:
+                        print(f"   ❌ {tool_name} 失败: {result.error or '未知错误'}")
                     
-                    # 通过 MCP 服务器执行
-                    result = self._call_tool(tool_name, tool_args)
-                    tool_results.append({
-                        "tool": tool_name,
-                        "result": result
-                    })
-                    
-                    # 输出执行结果摘要
-                    if isinstance(result, dict):
-                        if result.get("success"):
-                            print(f"   ✅ 成功")
-                        else:
-                            print(f"   ❌ 失败: {result.get('error', '未知错误')}")
-                
-                # 构建工具执行结果消息
-                result_content = "工具执行结果:\n"
-                for tr in tool_results:
-                    result_content += f"\n[{tr['tool']}]\n"
-                    result_content += json.dumps(tr['result'], ensure_ascii=False, indent=2)
+                    parts.append(f"\n[{tool_name}]\n")
+                    parts.append(json_utils.dumps(result.payload(), default=str))
+                result_content = "".join(parts)
                 
                 # 将 AI 响应和工具结果添加到历史
                 self.conversation_history.append({
@@ -263,6 +456,7 @@ class ArixaClient:
                     "role": "user",
                     "content": result_content
                 })
+                self._trim_history()
                 
                 # 继续循环，让 AI 处理工具结果
                 continue
@@ -280,53 +474,36 @@ class ArixaClient:
         
         if iteration >= max_iterations:
             final_response += "\n\n⚠️ 达到最大执行次数限制"
+            if on_delta:
+                on_delta("\n⚠️ 达到最大执行次数限制\n")
         
         return final_response
     
+    def _trim_history(self):
+        """对话历史超出 token 上限时，从最早的对话开始丢弃（保证历史以用户消息开头）"""
+        if not self.max_history_tokens:
+            return
+        
+        from src.ai_providers.provider_factory import fit_messages
+        start, _ = fit_messages(self.conversation_history, self.max_history_tokens)
+        if start:
+            logger.info(f"对话历史超出 {self.max_history_tokens} tokens，已丢弃最早的 {start} 条消息")
+            del self.conversation_history[:start]
+    
+    def _uncached_ai(self):
+        """返回不经过响应缓存的 AI 提供商"""
+        from src.ai_providers.cache import CachedProvider
+        return self.ai.provider if isinstance(self.ai, CachedProvider) else self.ai
+    
     def _extract_tool_calls_from_text(self, text: str) -> List[Dict]:
         """
         从 AI 响应文本中提取工具调用
-        支持多种格式
+        支持多种格式（见 provider_factory.parse_tool_blocks）
         """
-        tool_calls = []
-        
-        # 查找 JSON 代码块
-        json_pattern = r'```json\s*(.*?)\s*```'
-        matches = re.findall(json_pattern, text, re.DOTALL)
-        
-        for match in matches:
-            try:
-                data = json.loads(match)
-                
-                if isinstance(data, dict):
-                    action = data.get("action", "")
-                    
-                    if action == "tool_call":
-                        tool_calls.append({
-                            "name": data.get("tool"),
-                            "arguments": data.get("parameters", {})
-                        })
-                    
-                    elif action == "multi_step":
-                        for step in data.get("steps", []):
-                            tool_calls.append({
-                                "name": step.get("tool"),
-                                "arguments": step.get("parameters", {})
-                            })
-                    
-                    # 直接的工具调用格式
-                    elif "tool" in data and "parameters" in data:
-                        tool_calls.append({
-                            "name": data.get("tool"),
-                            "arguments": data.get("parameters", {})
-                        })
-                        
-            except json.JSONDecodeError:
-                logger.debug(f"JSON 解析失败: {match[:100]}...")
-        
-        return tool_calls
+        from src.ai_providers.provider_factory import parse_tool_blocks
+        return parse_tool_blocks(text)
     
-    def _call_tool(self, tool_name: str, params: Dict) -> Dict:
+    def _call_tool(self, tool_name: str, params: Dict) -> ToolResult:
         """
         调用 MCP 工具
         
@@ -335,31 +512,87 @@ class ArixaClient:
             params: 工具参数
         
         Returns:
-            工具执行结果
+            ToolResult
+        """
+        return self._run_async(self._call_tool_async(tool_name, params))
+    
+    def _run_async(self, coro):
+        """在同步代码中运行协程（复用同一个事件循环）"""
+        if self._loop is None or self._loop.is_closed():
+            # 安装了 uvloop 时使用 uvloop，事件调度开销更低
+            from src.utils.event_loop import new_event_loop
+            self._loop = new_event_loop()
+        
+        return self._loop.run_until_complete(coro)
+    
+    def close(self):
+        """释放客户端占用的资源（事件循环及其线程池）"""
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+    
+    async def _call_tools_async(self, tool_calls: List[Dict]) -> List[ToolResult]:
         """
+        按顺序执行一组工具调用，相邻的只读工具（如 file_read、file_list）并发执行
+        （同时最多 max_parallel_tools 个）
+        
+        其余工具（如综合 → 实现 → 生成比特流）依赖前一步的结果，仍逐个执行
+        
+        Returns:
+            与 tool_calls 顺序一致的执行结果
+        """
+        results = []
+        i = 0
+        while i < len(tool_calls):
+            # 收集从 i 开始的连续只读工具调用
+            j = i
+            while j < len(tool_calls) and self._is_read_only(tool_calls[j].get("name")):
+                j += 1
+            
+            if j > i:
+                semaphore = asyncio.Semaphore(max(1, self.max_parallel_tools))
+                
+                async def call_limited(tool_call: Dict) -> ToolResult:
+                    async with semaphore:
+                        return await self._call_tool_async(tool_call.get("name"), tool_call.get("arguments", {}))
+                
+                batch = await asyncio.gather(
+                    *(call_limited(tc) for tc in tool_calls[i:j]),
+                    return_exceptions=True
+                )
+                results.extend(
+                    ToolResult(False, error=str(r)) if isinstance(r, Exception) else r
+                    for r in batch
+                )
+                i = j
+            else:
+                tool_call = tool_calls[i]
+                results.append(await self._call_tool_async(tool_call.get("name"), tool_call.get("arguments", {})))
+                i += 1
+        
+        return results
+    
+    def _is_read_only(self, tool_name: str) -> bool:
+        """工具是否为只读工具"""
+        tool = self.mcp_server.tools.get(tool_name)
+        return tool is not None and tool.read_only
+    
+    async def _call_tool_async(self, tool_name: str, params: Dict) -> ToolResult:
+        """调用 MCP 工具（异步版本）"""
         from src.mcp_server.server import MCPRequest
         
         request = MCPRequest(
-            id="local-" + str(id(params)),
+            id="local-" + format(next(self._request_ids), "x"),
             method="tools/call",
             params={"name": tool_name, "arguments": params}
         )
         
-        # 同步调用异步方法
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            response = loop.run_until_complete(self.mcp_server.handle_request(request))
-        finally:
-            loop.close()
+        response = await self.mcp_server.handle_request(request)
         
         if response.error:
-            return {
-                "success": False,
-                "error": response.error.get("message", "未知错误")
-            }
+            return ToolResult(False, error=response.error.get("message", "未知错误"))
         
-        return response.result if response.result else {"success": True}
+        return ToolResult.from_response(response.result) if response.result else ToolResult(True, {"success": True})
     
     def chat_mode(self):
         """
@@ -398,10 +631,9 @@ class ArixaClient:
                     self._show_status()
                     continue
                 
-                # 执行命令
-                print("\n🔄 处理中...\n")
-                result = self.execute(user_input)
-                print(f"\nArixa: {result}")
+                # 执行命令，AI 回复边生成边输出
+                print("\nArixa: ", end="", flush=True)
+                self.execute(user_input, on_delta=StreamWriter())
                 
             except KeyboardInterrupt:
                 print("\n\n👋 再见！")
@@ -464,6 +696,7 @@ class ArixaClient:
   • status / 状态   - 显示当前状态
   • clear / 清除    - 清除对话历史
   • exit / 退出     - 退出程序
+  • @nocache 命令   - 不使用响应缓存，让 AI 重新回答
 
 📖 更多信息: https://github.com/EvolutionHumans/Arixa
 """
@@ -491,6 +724,22 @@ class ArixaClient:
         
         print(f"\n总计: {len(tools)} 个工具")
     
+    def _path_exists(self, path: str) -> bool:
+        """
+        检查程序路径是否存在
+        
+        结果按路径缓存 PROGRAM_CHECK_TTL 秒，反复查看状态时不必每次都访问文件系统；
+        程序配置修改后路径变化，自然不会命中旧的结果
+        """
+        now = time.monotonic()
+        cached = self._path_checks.get(path)
+        if cached is not None and now - cached[1] < self.PROGRAM_CHECK_TTL:
+            return cached[0]
+        
+        exists = os.path.exists(os.path.expanduser(path))
+        self._path_checks[path] = (exists, now)
+        return exists
+    
     def _show_status(self):
         """显示当前状态"""
         print("\n📊 当前状态")
@@ -500,10 +749,18 @@ class ArixaClient:
         print(f"对话轮次: {len(self.conversation_history) // 2}")
         print(f"当前项目: {self.mcp_server.current_project or '无'}")
         
+        # 响应缓存命中统计
+        cache = getattr(self.ai, "cache", None)
+        if cache is not None:
+            stats = cache.stats()
+            print(f"响应缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次（命中率 {stats['hit_rate']:.0%}）")
+        else:
+            print("响应缓存: 未启用（需要开启 ai.cache.enabled 并将温度设置为 0）")
+        
         # 显示已注册程序
         programs = self.config.get("programs", {})
         print(f"已注册程序: {len(programs)}")
         for name, info in programs.items():
             path = info.get("path", "") if isinstance(info, dict) else info
-            exists = "✅" if os.path.exists(os.path.expanduser(path)) else "❌"
+            exists = "✅" if self._path_exists(path) else "❌"
             print(f"   {exists} {name}")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tool Selector - 按语义相关度挑选发送给 AI 的工具
+每次调用 AI 都会附带全部工具定义，工具越多请求越长；
+开启后只发送与用户输入最相关的 top_k 个工具
+
+工具的 "名称 + 描述" 在首次使用时批量计算嵌入向量，工具列表不变时一直复用；
+用户输入与所有工具的相似度都低于阈值时（如闲聊或意图不明确），仍发送全部工具
+
+需要 sentence-transformers（依赖 numpy），未安装时自动停用
+"""
+
+from typing import List, Dict, Optional, Any
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ToolSelector:
+    """语义工具筛选"""
+    
+    DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    
+    def __init__(self, top_k: int = 8, threshold: float = 0.3, model_name: Optional[str] = None):
+        """
+        初始化工具筛选器
+        
+        Args:
+            top_k: 最多发送的工具数
+            threshold: 余弦相似度阈值，最相关的工具也低于该值时发送全部工具
+            model_name: 嵌入模型名称
+        """
+        self.top_k = top_k
+        self.threshold = threshold
+        self.model_name = model_name or self.DEFAULT_MODEL
+        self._model = None  # None 表示尚未加载，False 表示不可用
+        self._np = None
+        self._index_key = None  # 已建立索引的工具列表（名称, 描述）
+        self._matrix = None     # 每行是一个工具的单位向量
+        self._lock = threading.Lock()
+    
+    def select(self, query: str, tools: List[Dict]) -> List[Dict]:
+        """
+        挑选与 query 最相关的工具
+        
+        Args:
+            query: 用户输入
+            tools: 全部工具（get_tools_for_ai 格式）
+        
+        Returns:
+            选中的工具，保持原有顺序；无法筛选时返回 tools 本身
+        """
+        if len(tools) <= self.top_k or not query:
+            return tools
+        
+        matrix = self._index(tools)
+        if matrix is None:
+            return tools
+        
+        # 向量均已归一化，余弦相似度即点积
+        scores = matrix @ self._encode([query])[0]
+        if scores.max() < self.threshold:
+            return tools
+        
+        best = self._np.argpartition(-scores, self.top_k)[:self.top_k]
+        return [tools[i] for i in sorted(best)]
+    
+    def prepare(self, tools: List[Dict]):
+        """
+        预先加载嵌入模型并建立工具索引
+        
+        首次加载模型需要数秒，可在等待用户输入时于后台线程中调用，
+        第一条命令就不必等待
+        """
+        if len(tools) > self.top_k:
+            self._index(tools)
+    
+    def _index(self, tools: List[Dict]) -> Optional[Any]:
+        """返回工具列表的向量矩阵（工具列表变化时重新计算），模型不可用时返回 None"""
+        with self._lock:
+            if not self._load_model():
+                return None
+            
+            key = tuple((t["name"], t.get("description", "")) for t in tools)
+            if key != self._index_key:
+                self._matrix = self._encode([f"{name}: {description}" for name, description in key])
+                self._index_key = key
+            return self._matrix
+    
+    def _load_model(self) -> bool:
+        """加载嵌入模型（只尝试一次），返回是否可用"""
+        if self._model is None:
+            try:
+                import numpy as np
+                from sentence_transformers import SentenceTransformer
+                self._np = np
+                self._model = SentenceTransformer(self.model_name)
+            except ImportError:
+                logger.warning("sentence-transformers 库未安装，工具筛选已停用，运行: pip install sentence-transformers")
+                self._model = False
+            except Exception as e:
+                logger.warning(f"嵌入模型加载失败，工具筛选已停用: {e}")
+                self._model = False
+        
+        return bool(self._model)
+    
+    def _encode(self, texts: List[str]) -> Any:
+        """批量计算单位向量（float32 矩阵，每行对应一段文本）"""
+        vectors = self._model.encode(texts, normalize_embeddings=True)
+        return self._np.asarray(vectors, dtype=self._np.float32)
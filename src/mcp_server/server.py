@@ -16,21 +16,154 @@ Arixa MCP Server - Model Context Protocol 服务器
 - 系统命令执行
 """
 
-import json
 import asyncio
+import atexit
+import collections
+import functools
+import itertools
 import subprocess
 import os
 import sys
 import shutil
+import stat
 import glob
+import fnmatch
+import re
 from typing import Dict, Any, List, Optional, Callable
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass, field
 from enum import Enum
 import logging
 import tempfile
+import threading
+
+from src.utils import json_utils
 
 logger = logging.getLogger(__name__)
 
+# run_command 禁止执行的命令片段（不区分大小写）
+DANGEROUS_COMMAND_PATTERNS = (
+    'rm -rf /', 'rm -rf ~', 'rm -rf *',
+    'format', 'mkfs',
+    'dd if=/dev/zero',
+    'del /s /q c:\\',
+    ':(){ :|:& };:'  # fork bomb
+)
+
+# 所有片段编译为一个正则，一次扫描完成匹配，也不必先把命令转为小写
+_DANGEROUS_COMMAND_RE = re.compile("|".join(map(re.escape, DANGEROUS_COMMAND_PATTERNS)), re.IGNORECASE)
+
+
+def _scan_dir(dir_path: str, pattern: str, recursive: bool):
+    """
+    用 os.scandir 列出目录中名称匹配 pattern 的条目（pattern 只匹配文件名）
+    
+    与 glob 的规则一致：pattern 不以 . 开头时忽略隐藏文件，递归时不进入隐藏目录
+    """
+    # 与 glob 一样按操作系统决定是否区分大小写
+    flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0
+    match = re.compile(fnmatch.translate(pattern), flags).match
+    include_hidden = pattern.startswith(".")
+    
+    pending = [dir_path]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                hidden = entry.name.startswith(".")
+                if match(entry.name) and (include_hidden or not hidden):
+                    yield entry
+                if recursive and not hidden and entry.is_dir():
+                    pending.append(entry.path)
+
+
+def _write_file(file_path: str, content: str, overwrite: bool = True):
+    """
+    以 UTF-8 写入文本文件，父目录不存在时自动创建
+    
+    直接使用 os.open / os.write，不经过 TextIOWrapper 和 BufferedWriter；
+    换行符与文本模式的 open() 一样转换为 os.linesep。
+    只在打开失败时才创建父目录，目录已存在（最常见的情况）时不必先检查。
+    
+    Raises:
+        FileExistsError: overwrite 为 False 且文件已存在
+    """
+    if os.linesep != "\n":
+        content = content.replace("\n", os.linesep)
+    data = content.encode("utf-8")
+    
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0) | getattr(os, "O_CLOEXEC", 0)
+    flags |= os.O_TRUNC if overwrite else os.O_EXCL
+    
+    try:
+        fd = os.open(file_path, flags, 0o666)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        fd = os.open(file_path, flags, 0o666)
+    
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+@functools.lru_cache(maxsize=None)
+def _platform_info() -> Dict[str, str]:
+    """
+    平台信息（进程运行期间不会变化，只查询一次）
+    
+    platform.processor() 等在部分系统上需要启动子进程或读取 /proc，开销远大于处理函数本身
+    """
+    import platform
+    
+    return {
+        "system": platform.system(),
+        "release": platform.release(),
+        "version": platform.version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "python_version": platform.python_version()
+    }
+
+
+# vivado_add_sources：扩展名 → add_files 的文件集参数（{fileset} 为调用时指定的文件集，其他扩展名不指定文件集）
+_ADD_FILES_OPTIONS = {
+    ".xdc": "-fileset constrs_1 ",
+    ".v": "-fileset {fileset} ",
+    ".sv": "-fileset {fileset} ",
+    ".vhd": "-fileset {fileset} ",
+}
+
+
+def _prune_logs(dir_path: str, prefix: str, suffix: str, keep: int):
+    """删除 dir_path 中名称为 prefix*suffix 的旧文件，只保留修改时间最新的 keep 个"""
+    logs = []
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.name.startswith(prefix) and entry.name.endswith(suffix) and entry.is_file():
+                try:
+                    logs.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+    
+    if len(logs) <= keep:
+        return
+    
+    logs.sort()
+    for _, path in logs[:len(logs) - max(keep, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # 可能正被其他运行写入（Windows 上无法删除），下次再清理
+
+
+def _drain_output(stream, log_fd: int, tail: collections.deque):
+    """逐行读取子进程输出：原样追加到日志文件，解码后放入只保留最后若干行的 tail"""
+    with stream:
+        for line in stream:
+            os.write(log_fd, line)
+            tail.append(line.decode("utf-8", errors="replace"))
+
 
 class ToolCategory(Enum):
     """工具类别"""
@@ -45,7 +178,11 @@ class ToolCategory(Enum):
     CODE_GEN = "code_generation"
 
 
-@dataclass
+# 每个请求都会创建 MCPRequest/MCPResponse：Python 3.10+ 使用 __slots__，实例不带 __dict__，更省内存
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class MCPTool:
     """MCP 工具定义"""
     name: str
@@ -53,6 +190,7 @@ class MCPTool:
     category: ToolCategory
     parameters: Dict[str, Any]
     handler: Optional[Callable] = field(default=None, repr=False)
+    read_only: bool = False  # 只读工具不改变任何状态，可与其他只读工具并发执行
     
     def to_dict(self) -> Dict:
         return {
@@ -63,7 +201,7 @@ class MCPTool:
         }
 
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class MCPRequest:
     """MCP 请求"""
     id: str
@@ -71,7 +209,7 @@ class MCPRequest:
     params: Dict[str, Any]
 
 
-@dataclass  
+@dataclass(**_DATACLASS_SLOTS)
 class MCPResponse:
     """MCP 响应"""
     id: str
@@ -94,8 +232,49 @@ class MCPServer:
         self.tools: Dict[str, MCPTool] = {}
         self.running = False
         self.current_project = None  # 当前打开的项目
+        # 工具定义只在注册工具时变化，缓存生成结果（register_tool 时清空）
+        self._schema_cache: Optional[List[Dict]] = None
+        self._schema_bytes_cache: Optional[bytes] = None
+        self._ai_tools_cache: Optional[List[Dict]] = None
+        # 工具名 → 处理函数是否为协程函数（注册时判断一次，调用时不再检查）
+        self._async_handlers: Dict[str, bool] = {}
+        # 执行同步工具处理函数的线程池（首次使用时创建）
+        self._executor = None
+        # 常驻 Vivado 进程（programs.vivado.persistent 开启时使用，首次使用时创建）
+        self._vivado_session = None
+        self._vivado_session_lock = threading.Lock()
+        # 未配置 Vivado 路径时自动检测到的路径（检测需要扫描安装目录，只做一次）
+        self._detected_vivado_path: Optional[str] = None
+        # 已创建的临时目录
+        self._temp_dir: Optional[str] = None
+        # 每个线程专用的 TCL 脚本文件（见 _write_tcl_script）
+        self._tcl_files = threading.local()
+        self._tcl_file_ids = itertools.count(1)        # 线程首次写脚本时分配的编号
+        self._tcl_open_files: Dict[str, int] = {}      # 已打开的脚本文件路径 → fd（退出时关闭并删除）
+        self._tcl_files_lock = threading.Lock()
+        # 延后执行的项目设置命令（programs.vivado.batch_setup 开启时使用，见 _queue_vivado_tcl）
+        self._tcl_queue: List[str] = []
+        self._tcl_queue_open: Optional[str] = None  # 排队命令所属项目的 open_project 命令
+        self._tcl_queue_lock = threading.Lock()
+        # MCP 方法名 → 处理函数
+        self._methods = {
+            "tools/list": self._method_tools_list,
+            "tools/call": self._method_tools_call,
+        }
         self._register_all_tools()
         
+    @property
+    def current_project(self) -> Optional[str]:
+        """当前打开的项目（.xpr 路径）"""
+        return self._current_project
+    
+    @current_project.setter
+    def current_project(self, project_path: Optional[str]):
+        self._current_project = project_path
+        # 几乎每个 Vivado 处理函数都以这条命令开头，切换项目时生成一次；
+        # 命令排队和常驻 Vivado 也按这个格式识别脚本打开的项目
+        self._open_project_command = f'open_project "{project_path}"' if project_path else None
+    
     def _register_all_tools(self):
         """注册所有工具"""
         self._register_vivado_tools()
@@ -160,6 +339,14 @@ class MCPServer:
             handler=self._handle_vivado_set_top
         ))
         
+        self.register_tool(MCPTool(
+            name="vivado_flush_queue",
+            description="立即执行已排队的项目设置命令（添加源文件、设置顶层等）",
+            category=ToolCategory.PROJECT,
+            parameters={},
+            handler=self._handle_vivado_flush_queue
+        ))
+        
         self.register_tool(MCPTool(
             name="vivado_run_synthesis",
             description="运行综合",
@@ -258,7 +445,8 @@ class MCPServer:
             parameters={
                 "file_path": {"type": "string", "description": "文件路径", "required": True}
             },
-            handler=self._handle_file_read
+            handler=self._handle_file_read,
+            read_only=True
         ))
         
         self.register_tool(MCPTool(
@@ -303,7 +491,8 @@ class MCPServer:
                 "pattern": {"type": "string", "description": "文件匹配模式，如 *.v", "required": False},
                 "recursive": {"type": "boolean", "description": "是否递归搜索", "required": False}
             },
-            handler=self._handle_file_list
+            handler=self._handle_file_list,
+            read_only=True
         ))
         
         self.register_tool(MCPTool(
@@ -361,7 +550,8 @@ class MCPServer:
             description="获取系统信息",
             category=ToolCategory.SYSTEM,
             parameters={},
-            handler=self._handle_system_info
+            handler=self._handle_system_info,
+            read_only=True
         ))
         
         self.register_tool(MCPTool(
@@ -369,7 +559,8 @@ class MCPServer:
             description="列出所有已注册的本地程序",
             category=ToolCategory.SYSTEM,
             parameters={},
-            handler=self._handle_list_programs
+            handler=self._handle_list_programs,
+            read_only=True
         ))
         
         self.register_tool(MCPTool(
@@ -429,61 +620,60 @@ class MCPServer:
     def register_tool(self, tool: MCPTool):
         """注册工具"""
         self.tools[tool.name] = tool
-        logger.debug(f"注册工具: {tool.name}")
+        self._async_handlers[tool.name] = asyncio.iscoroutinefunction(tool.handler)
+        self._schema_cache = None
+        self._schema_bytes_cache = None
+        self._ai_tools_cache = None
+        logger.debug("注册工具: %s", tool.name)
         
     def get_tools_schema(self) -> List[Dict]:
-        """获取所有工具的 schema（用于 AI）"""
-        return [tool.to_dict() for tool in self.tools.values()]
+        """获取所有工具的 schema（用于 AI），返回的列表是共享的缓存，调用方不应修改"""
+        if self._schema_cache is None:
+            self._schema_cache = [tool.to_dict() for tool in self.tools.values()]
+        return self._schema_cache
+    
+    def get_tools_schema_bytes(self) -> bytes:
+        """tools/list 结果 {"tools": [...]} 的 JSON 编码（缓存）"""
+        if self._schema_bytes_cache is None:
+            self._schema_bytes_cache = json_utils.dumps_bytes({"tools": self.get_tools_schema()}, default=str)
+        return self._schema_bytes_cache
+    
+    def tools_list_response(self, request_id: Any) -> bytes:
+        """
+        tools/list 的完整响应行
+        
+        工具定义只编码一次，每次请求只编码 id，拼接时只复制一次
+        """
+        return b"".join((
+            b'{"id":', json_utils.dumps_bytes(request_id, default=str),
+            b',"result":', self.get_tools_schema_bytes(), b',"error":null}\n'
+        ))
     
     def get_tools_for_ai(self) -> List[Dict]:
-        """获取 AI function calling 格式的工具定义"""
-        tools = []
-        for tool in self.tools.values():
-            tools.append({
+        """获取 AI function calling 格式的工具定义，返回的列表是共享的缓存，调用方不应修改"""
+        if self._ai_tools_cache is None:
+            self._ai_tools_cache = [{
                 "name": tool.name,
                 "description": tool.description,
                 "parameters": tool.parameters
-            })
-        return tools
+            } for tool in self.tools.values()]
+        return self._ai_tools_cache
 
     # ==================== 请求处理 ====================
     
     async def handle_request(self, request: MCPRequest) -> MCPResponse:
         """处理 MCP 请求"""
-        logger.info(f"处理请求: {request.method}")
+        logger.info("处理请求: %s", request.method)
         
         try:
-            if request.method == "tools/list":
-                return MCPResponse(
-                    id=request.id,
-                    result={"tools": self.get_tools_schema()}
-                )
-            
-            elif request.method == "tools/call":
-                tool_name = request.params.get("name")
-                tool_params = request.params.get("arguments", {})
-                
-                if tool_name not in self.tools:
-                    return MCPResponse(
-                        id=request.id,
-                        error={"code": -32601, "message": f"未知工具: {tool_name}"}
-                    )
-                
-                tool = self.tools[tool_name]
-                if tool.handler:
-                    result = await self._execute_handler(tool.handler, tool_params)
-                    return MCPResponse(id=request.id, result=result)
-                else:
-                    return MCPResponse(
-                        id=request.id,
-                        error={"code": -32603, "message": f"工具 {tool_name} 未实现处理函数"}
-                    )
-            
-            else:
+            method = self._methods.get(request.method)
+            if method is None:
                 return MCPResponse(
                     id=request.id,
                     error={"code": -32601, "message": f"未知方法: {request.method}"}
                 )
+            
+            return await method(request)
                 
         except Exception as e:
             logger.error(f"请求处理错误: {e}", exc_info=True)
@@ -492,20 +682,70 @@ class MCPServer:
                 error={"code": -32603, "message": str(e)}
             )
     
-    async def _execute_handler(self, handler: Callable, params: Dict) -> Any:
-        """执行工具处理函数"""
-        if asyncio.iscoroutinefunction(handler):
+    async def _method_tools_list(self, request: MCPRequest) -> MCPResponse:
+        """tools/list：列出所有工具"""
+        return MCPResponse(
+            id=request.id,
+            result={"tools": self.get_tools_schema()}
+        )
+    
+    async def _method_tools_call(self, request: MCPRequest) -> MCPResponse:
+        """tools/call：调用工具"""
+        tool_name = request.params.get("name")
+        tool_params = request.params.get("arguments", {})
+        
+        tool = self.tools.get(tool_name)
+        if tool is None:
+            return MCPResponse(
+                id=request.id,
+                error={"code": -32601, "message": f"未知工具: {tool_name}"}
+            )
+        
+        if tool.handler:
+            result = await self._execute_handler(tool.handler, tool_params, self._async_handlers[tool_name])
+            return MCPResponse(id=request.id, result=result)
+        else:
+            return MCPResponse(
+                id=request.id,
+                error={"code": -32603, "message": f"工具 {tool_name} 未实现处理函数"}
+            )
+    
+    async def _execute_handler(self, handler: Callable, params: Dict, is_async: Optional[bool] = None) -> Any:
+        """执行工具处理函数（同步函数在线程池中执行，不阻塞事件循环）"""
+        if is_async is None:
+            is_async = asyncio.iscoroutinefunction(handler)
+        
+        if is_async:
             return await handler(params)
         else:
-            return handler(params)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), functools.partial(handler, params))
+    
+    def _get_executor(self):
+        """
+        获取工具专用线程池
+        
+        综合、实现等工具会占用线程数十分钟，与事件循环的默认线程池分开，
+        不会占满 AI 请求等其他任务使用的线程；线程数由 mcp.workers 配置（默认 10）
+        """
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, self.config.get("mcp.workers", 10)),
+                thread_name_prefix="mcp-tool"
+            )
+        return self._executor
 
     # ==================== Vivado 处理函数 ====================
     
     def _get_vivado_path(self) -> str:
         """获取 Vivado 可执行文件路径"""
+        # 配置每次都重新读取：运行期间可能通过 register_program 修改
         vivado_path = self.config.get("programs.vivado.path")
         
-        if not vivado_path:
+        if not vivado_path and self._detected_vivado_path:
+            vivado_path = self._detected_vivado_path
+        elif not vivado_path:
             # 尝试自动检测
             if sys.platform == "win32":
                 possible = glob.glob("C:/Xilinx/Vivado/*/bin/vivado.bat")
@@ -514,46 +754,217 @@ class MCPServer:
                           glob.glob("/tools/Xilinx/Vivado/*/bin/vivado")
             
             if possible:
-                vivado_path = sorted(possible)[-1]  # 使用最新版本
+                vivado_path = self._detected_vivado_path = max(possible)  # 使用最新版本
                 logger.info(f"自动检测到 Vivado: {vivado_path}")
             else:
                 raise Exception("Vivado 路径未配置且未能自动检测，请运行 arixa --setup")
         
         return vivado_path
     
+    # Vivado 输出在结果中保留的最大行数（完整输出见 log_path）
+    VIVADO_OUTPUT_TAIL_LINES = 4096
+    
     def _run_vivado_tcl(self, tcl_commands: List[str], batch: bool = True) -> Dict:
         """执行 Vivado TCL 命令"""
         vivado_path = self._get_vivado_path()
+        tcl_commands = self._take_vivado_queue(tcl_commands)
         
         # 创建临时 TCL 脚本
         temp_dir = self.config.get("temp_dir") or tempfile.gettempdir()
-        os.makedirs(temp_dir, exist_ok=True)
-        tcl_file = os.path.join(temp_dir, "arixa_temp.tcl")
+        if temp_dir != self._temp_dir:
+            os.makedirs(temp_dir, exist_ok=True)
+            self._temp_dir = temp_dir
+        
+        if batch and self.config.get("programs.vivado.persistent", False):
+            return self._run_vivado_session(vivado_path, temp_dir, tcl_commands)
         
         # 写入 TCL 脚本
         tcl_script = "\n".join(tcl_commands)
-        with open(tcl_file, 'w', encoding='utf-8') as f:
-            f.write(tcl_script)
+        tcl_file = self._write_tcl_script(temp_dir, tcl_script)
         
-        logger.info(f"执行 TCL 脚本:\n{tcl_script}")
+        # 脚本可能很长，使用惰性格式化，日志级别高于 INFO 时不拼接字符串
+        logger.info("执行 TCL 脚本:\n%s", tcl_script)
         
         # 构建命令
         cmd = [vivado_path, "-mode", "batch" if batch else "tcl", "-source", tcl_file]
         
         try:
-            result = subprocess.run(
-                cmd, 
-                capture_output=True, 
-                text=True, 
-                timeout=3600,
-                cwd=os.path.dirname(tcl_file)
-            )
+            # 综合、实现的输出可能很长：边运行边写入日志文件，内存中只保留最后若干行；
+            # 工具会并发执行，每次运行使用单独的日志文件，结果中的 log_path 不会被之后的运行覆盖；
+            # 只保留最近的若干个日志（programs.vivado.keep_logs，默认 20）
+            _prune_logs(temp_dir, "arixa_vivado_", ".log", self.config.get("programs.vivado.keep_logs", 20) - 1)
+            fd, log_path = tempfile.mkstemp(suffix=".log", prefix="arixa_vivado_", dir=temp_dir)
+            os.close(fd)
+            # 标准输出和标准错误由两个线程写入同一文件，以追加模式打开，各自的写入不会互相覆盖
+            log_fd = os.open(log_path, os.O_WRONLY | os.O_APPEND)
+            try:
+                try:
+                    process = subprocess.Popen(
+                        cmd,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                        cwd=os.path.dirname(tcl_file)
+                    )
+                except OSError:
+                    # 没有启动 Vivado（如找不到可执行文件），空日志没有保留的意义
+                    os.close(log_fd)
+                    log_fd = None
+                    os.remove(log_path)
+                    raise
+                stdout_tail = collections.deque(maxlen=self.VIVADO_OUTPUT_TAIL_LINES)
+                stderr_tail = collections.deque(maxlen=self.VIVADO_OUTPUT_TAIL_LINES)
+                readers = [
+                    threading.Thread(target=_drain_output, args=(process.stdout, log_fd, stdout_tail), daemon=True),
+                    threading.Thread(target=_drain_output, args=(process.stderr, log_fd, stderr_tail), daemon=True)
+                ]
+                for reader in readers:
+                    reader.start()
+                
+                try:
+                    return_code = process.wait(timeout=3600)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                    raise
+                finally:
+                    for reader in readers:
+                        reader.join()
+            finally:
+                if log_fd is not None:
+                    os.close(log_fd)
             
             return {
-                "success": result.returncode == 0,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "return_code": result.returncode,
+                "success": return_code == 0,
+                "stdout": "".join(stdout_tail),
+                "stderr": "".join(stderr_tail),
+                "return_code": return_code,
+                "log_path": log_path,
+                "tcl_script": tcl_script
+            }
+        except subprocess.TimeoutExpired:
+            return {"success": False, "error": "Vivado 执行超时（1小时）", "log_path": log_path}
+        except FileNotFoundError:
+            return {"success": False, "error": f"找不到 Vivado: {vivado_path}"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def _queue_vivado_tcl(self, tcl_commands: List[str]) -> Dict:
+        """
+        执行或延后执行当前项目的设置命令（tcl_commands 格式为 open_project、命令、close_project、exit）
+        
+        每次启动 Vivado 都要等待数十秒，开启 programs.vivado.batch_setup 后，
+        添加源文件、设置顶层等命令先排队，在下一次打开同一项目的 Vivado 调用（综合、实现等）中一起执行
+        """
+        if not self.config.get("programs.vivado.batch_setup", False):
+            return self._run_vivado_tcl(tcl_commands)
+        
+        body = [command for command in tcl_commands[1:] if command not in ("close_project", "exit")]
+        with self._tcl_queue_lock:
+            self._tcl_queue_open = self._open_project_command
+            self._tcl_queue.extend(body)
+            queued = len(self._tcl_queue)
+        
+        return {
+            "success": True,
+            "queued": True,
+            "queued_commands": queued,
+            "message": "命令已排队，将在下一次运行综合、实现等操作时一起执行（或调用 vivado_flush_queue 立即执行）"
+        }
+    
+    def _take_vivado_queue(self, tcl_commands: List[str]) -> List[str]:
+        """脚本打开的是排队命令所属的项目时，把排队的命令插入到 open_project 之后"""
+        if not self._tcl_queue or not tcl_commands:
+            return tcl_commands
+        
+        with self._tcl_queue_lock:
+            if not self._tcl_queue or tcl_commands[0] != self._tcl_queue_open:
+                return tcl_commands
+            queued, self._tcl_queue = self._tcl_queue, []
+        
+        logger.info(f"一并执行 {len(queued)} 条排队的命令")
+        return tcl_commands[:1] + queued + tcl_commands[1:]
+    
+    def _flush_vivado_queue(self) -> Optional[Dict]:
+        """执行排队的命令，没有排队的命令时返回 None"""
+        if not self._tcl_queue:
+            return None
+        return self._run_vivado_tcl([self._tcl_queue_open, 'close_project', 'exit'])
+    
+    def _write_tcl_script(self, temp_dir: str, tcl_script: str) -> str:
+        """
+        写入当前线程专用的 TCL 脚本文件，返回文件路径
+        
+        工具在线程池中并发执行，每个线程使用自己的文件，互不覆盖；
+        文件只打开一次并保持打开，之后每次截断后重写
+        """
+        files = self._tcl_files
+        if getattr(files, "temp_dir", None) != temp_dir:
+            if getattr(files, "path", None) is not None:
+                self._remove_tcl_file(files.path)
+            else:
+                # 按线程首次使用的顺序编号，文件数不超过执行过 Vivado 工具的线程数
+                files.id = next(self._tcl_file_ids)
+            files.path = os.path.join(temp_dir, f"arixa_temp_{os.getpid()}_{files.id}.tcl")
+            files.fd = os.open(files.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            files.temp_dir = temp_dir
+            with self._tcl_files_lock:
+                if not self._tcl_open_files:
+                    atexit.register(self._remove_tcl_files)
+                self._tcl_open_files[files.path] = files.fd
+        
+        os.ftruncate(files.fd, 0)
+        os.lseek(files.fd, 0, os.SEEK_SET)
+        view = memoryview(tcl_script.encode("utf-8"))
+        while view:
+            view = view[os.write(files.fd, view):]
+        return files.path
+    
+    def _remove_tcl_file(self, path: str):
+        """关闭并删除一个 TCL 脚本文件"""
+        with self._tcl_files_lock:
+            fd = self._tcl_open_files.pop(path, None)
+            if not self._tcl_open_files:
+                atexit.unregister(self._remove_tcl_files)
+        if fd is not None:
+            os.close(fd)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def _remove_tcl_files(self):
+        """关闭并删除所有 TCL 脚本文件（进程退出时调用）"""
+        for path in list(self._tcl_open_files):
+            self._remove_tcl_file(path)
+    
+    def _run_vivado_session(self, vivado_path: str, temp_dir: str, tcl_commands: List[str]) -> Dict:
+        """在常驻 Vivado 进程中执行 TCL 命令，返回值与 _run_vivado_tcl 相同"""
+        from src.mcp_server.vivado_session import VivadoSession
+        
+        with self._vivado_session_lock:
+            session = self._vivado_session
+            if session is None or session.vivado_path != vivado_path:
+                if session is not None:
+                    session.close()
+                session = self._vivado_session = VivadoSession(vivado_path, temp_dir)
+                atexit.register(session.close)
+        
+        # 常驻进程不能执行 exit；
+        # 以 open_project 开头的脚本由常驻进程负责打开项目，执行后项目保持打开，不再 close_project
+        project = None
+        if tcl_commands and tcl_commands[0].startswith('open_project "'):
+            project = tcl_commands[0][len('open_project "'):-1]
+            tcl_commands = [command for command in tcl_commands[1:] if command not in ("close_project", "exit")]
+        tcl_script = "\n".join(command for command in tcl_commands if command.strip() != "exit")
+        logger.info("执行 TCL 脚本（常驻 Vivado，项目: %s）:\n%s", project, tcl_script)
+        
+        try:
+            return_code, output = session.run(tcl_script, timeout=3600, project=project)
+            return {
+                "success": return_code == 0,
+                "stdout": output,
+                "stderr": "",
+                "return_code": return_code,
                 "tcl_script": tcl_script
             }
         except subprocess.TimeoutExpired:
@@ -570,6 +981,10 @@ class MCPServer:
         part = params["part"]
         board = params.get("board", "")
         
+        flushed = self._flush_vivado_queue()
+        if flushed and not flushed["success"]:
+            return flushed
+        
         # 创建项目目录
         os.makedirs(project_path, exist_ok=True)
         
@@ -606,6 +1021,10 @@ class MCPServer:
         if not os.path.exists(project_path):
             return {"success": False, "error": f"项目文件不存在: {project_path}"}
         
+        flushed = self._flush_vivado_queue()
+        if flushed and not flushed["success"]:
+            return flushed
+        
         self.current_project = project_path
         
         return {
@@ -616,9 +1035,17 @@ class MCPServer:
     
     def _handle_vivado_close_project(self, params: Dict) -> Dict:
         """关闭项目"""
+        flushed = self._flush_vivado_queue()
+        if flushed and not flushed["success"]:
+            return flushed
+        
         self.current_project = None
         return {"success": True, "message": "项目已关闭"}
     
+    def _handle_vivado_flush_queue(self, params: Dict) -> Dict:
+        """执行已排队的项目设置命令"""
+        return self._flush_vivado_queue() or {"success": True, "message": "没有排队的命令"}
+    
     def _handle_vivado_add_sources(self, params: Dict) -> Dict:
         """添加源文件"""
         if not self.current_project:
@@ -627,20 +1054,18 @@ class MCPServer:
         files = params["files"]
         fileset = params.get("fileset", "sources_1")
         
-        tcl_commands = [f'open_project "{self.current_project}"']
-        
+        # 按文件集分组，每个文件集只生成一条 add_files（保持首次出现的顺序）
+        groups: Dict[str, List[str]] = {}
         for file_path in files:
             file_path = os.path.expanduser(file_path)
-            if file_path.endswith(".xdc"):
-                tcl_commands.append(f'add_files -fileset constrs_1 "{file_path}"')
-            elif file_path.endswith((".v", ".sv", ".vhd")):
-                tcl_commands.append(f'add_files -fileset {fileset} "{file_path}"')
-            else:
-                tcl_commands.append(f'add_files "{file_path}"')
+            option = _ADD_FILES_OPTIONS.get(os.path.splitext(file_path)[1].lower(), "")
+            groups.setdefault(option.format(fileset=fileset), []).append(f'"{file_path}"')
         
+        tcl_commands = [self._open_project_command]
+        tcl_commands.extend(f'add_files {option}[list {" ".join(paths)}]' for option, paths in groups.items())
         tcl_commands.extend(['close_project', 'exit'])
         
-        return self._run_vivado_tcl(tcl_commands)
+        return self._queue_vivado_tcl(tcl_commands)
     
     def _handle_vivado_set_top(self, params: Dict) -> Dict:
         """设置顶层模块"""
@@ -650,14 +1075,14 @@ class MCPServer:
         top_module = params["top_module"]
         
         tcl_commands = [
-            f'open_project "{self.current_project}"',
+            self._open_project_command,
             f'set_property top {top_module} [current_fileset]',
             'update_compile_order -fileset sources_1',
             'close_project',
             'exit'
         ]
         
-        return self._run_vivado_tcl(tcl_commands)
+        return self._queue_vivado_tcl(tcl_commands)
     
     def _handle_vivado_synthesis(self, params: Dict) -> Dict:
         """运行综合"""
@@ -667,7 +1092,7 @@ class MCPServer:
         jobs = params.get("jobs", 4)
         
         tcl_commands = [
-            f'open_project "{self.current_project}"',
+            self._open_project_command,
             'reset_run synth_1',
             f'launch_runs synth_1 -jobs {jobs}',
             'wait_on_run synth_1',
@@ -685,7 +1110,7 @@ class MCPServer:
         jobs = params.get("jobs", 4)
         
         tcl_commands = [
-            f'open_project "{self.current_project}"',
+            self._open_project_command,
             f'launch_runs impl_1 -jobs {jobs}',
             'wait_on_run impl_1',
             'close_project',
@@ -703,18 +1128,31 @@ class MCPServer:
         bin_file = params.get("bin_file", False)
         
         tcl_commands = [
-            f'open_project "{self.current_project}"',
+            self._open_project_command,
             'open_run impl_1',
         ]
         
+        # 压缩后比特流更小，JTAG 烧录和从 Flash 加载都更快
         if compress:
             tcl_commands.append('set_property BITSTREAM.GENERAL.COMPRESS TRUE [current_design]')
         
         if bin_file:
-            tcl_commands.append('write_cfgmem -format bin -interface spix4 -size 16 -loadbit "up 0x0 [get_property DIRECTORY [current_run]]/[get_property top [current_fileset]].bit" -file output.bin -force')
+            # .bin 用于 SPI x4 Flash，比特流也按 x4 总线生成，从 Flash 加载时使用 4 位数据线
+            tcl_commands.extend([
+                'set_property CONFIG_MODE SPIx4 [current_design]',
+                'set_property BITSTREAM.CONFIG.SPI_BUSWIDTH 4 [current_design]'
+            ])
+        
+        tcl_commands.extend([
+            'set arixa_bit [get_property DIRECTORY [current_run]]/[get_property top [current_fileset]]',
+            'write_bitstream -force $arixa_bit.bit'
+        ])
+        
+        # write_cfgmem 读取刚生成的 .bit，必须在 write_bitstream 之后
+        if bin_file:
+            tcl_commands.append('write_cfgmem -format bin -interface spix4 -size 16 -loadbit "up 0x0 $arixa_bit.bit" -file $arixa_bit.bin -force')
         
         tcl_commands.extend([
-            'write_bitstream -force [get_property DIRECTORY [current_run]]/[get_property top [current_fileset]].bit',
             'close_project',
             'exit'
         ])
@@ -758,7 +1196,7 @@ class MCPServer:
         sim_time = params.get("sim_time", "1us")
         
         tcl_commands = [
-            f'open_project "{self.current_project}"',
+            self._open_project_command,
             f'set_property top {testbench} [get_filesets sim_1]',
             'launch_simulation',
             f'run {sim_time}',
@@ -777,36 +1215,48 @@ class MCPServer:
         report_type = params["report_type"]
         
         report_commands = {
-            "utilization": "report_utilization -return_string",
-            "timing": "report_timing_summary -return_string",
-            "power": "report_power -return_string",
-            "drc": "report_drc -return_string"
+            "utilization": "report_utilization",
+            "timing": "report_timing_summary",
+            "power": "report_power",
+            "drc": "report_drc"
         }
         
         if report_type not in report_commands:
             return {"success": False, "error": f"未知报告类型: {report_type}，支持: {list(report_commands.keys())}"}
         
-        tcl_commands = [
-            f'open_project "{self.current_project}"',
-            'open_run impl_1',
-            f'puts [' + report_commands[report_type] + ']',
-            'close_project',
-            'exit'
-        ]
-        
-        result = self._run_vivado_tcl(tcl_commands)
-        
-        if result["success"]:
-            result["report"] = result.get("stdout", "")
+        # 报告直接写入文件：标准输出中还有打开项目等日志，且结果中只保留最后若干行，大型设计的报告会被截断
+        temp_dir = self.config.get("temp_dir") or tempfile.gettempdir()
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, report_file = tempfile.mkstemp(suffix=".rpt", prefix="arixa_", dir=temp_dir)
+        os.close(fd)
         
-        return result
+        try:
+            tcl_commands = [
+                self._open_project_command,
+                'open_run impl_1',
+                f'{report_commands[report_type]} -file "{report_file.replace(os.sep, "/")}"',
+                'close_project',
+                'exit'
+            ]
+            
+            result = self._run_vivado_tcl(tcl_commands)
+            
+            if result["success"]:
+                with open(report_file, 'r', encoding='utf-8', errors='replace') as f:
+                    result["report"] = f.read()
+                # 只返回报告本身，不再附带 Vivado 的输出
+                result.pop("stdout", None)
+            
+            return result
+        finally:
+            os.remove(report_file)
     
     def _handle_vivado_tcl(self, params: Dict) -> Dict:
         """执行自定义 TCL 命令"""
         commands = params["commands"]
         
         if self.current_project:
-            commands.insert(0, f'open_project "{self.current_project}"')
+            commands.insert(0, self._open_project_command)
             commands.append('close_project')
         
         commands.append('exit')
@@ -821,13 +1271,8 @@ class MCPServer:
         content = params["content"]
         overwrite = params.get("overwrite", True)
         
-        if os.path.exists(file_path) and not overwrite:
-            return {"success": False, "error": f"文件已存在: {file_path}"}
-        
         try:
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            _write_file(file_path, content, overwrite)
             
             return {
                 "success": True,
@@ -835,6 +1280,8 @@ class MCPServer:
                 "file_path": file_path,
                 "size": len(content)
             }
+        except FileExistsError:
+            return {"success": False, "error": f"文件已存在: {file_path}"}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
@@ -868,16 +1315,17 @@ class MCPServer:
             return {"success": False, "error": f"文件不存在: {file_path}"}
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
+            # 只打开一次文件：读出内容、定位要替换的位置后回到开头写入，不再拼接整个新文件内容
+            with open(file_path, 'r+', encoding='utf-8') as f:
                 content = f.read()
-            
-            if old_content not in content:
-                return {"success": False, "error": "未找到要替换的内容"}
-            
-            new_file_content = content.replace(old_content, new_content, 1)
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(new_file_content)
+                
+                index = content.find(old_content)
+                if index < 0:
+                    return {"success": False, "error": "未找到要替换的内容"}
+                
+                f.seek(0)
+                f.writelines((content[:index], new_content, content[index + len(old_content):]))
+                f.truncate()
             
             return {
                 "success": True,
@@ -930,21 +1378,34 @@ class MCPServer:
             return {"success": False, "error": f"目录不存在: {dir_path}"}
         
         try:
-            if recursive:
-                search_pattern = os.path.join(dir_path, "**", pattern)
-                files = glob.glob(search_pattern, recursive=True)
+            if "/" in pattern or os.sep in pattern or "**" in pattern:
+                # 模式中包含目录部分，交给 glob 处理
+                if recursive:
+                    files = glob.glob(os.path.join(dir_path, "**", pattern), recursive=True)
+                else:
+                    files = glob.glob(os.path.join(dir_path, pattern))
+                
+                # 每个路径只 stat 一次，类型和大小都从同一个结果中取
+                file_list = []
+                for f in files:
+                    try:
+                        st = os.stat(f)
+                    except OSError:
+                        continue  # glob 之后被删除，或是失效的符号链接
+                    file_list.append({
+                        "path": f,
+                        "name": os.path.basename(f),
+                        "is_dir": stat.S_ISDIR(st.st_mode),
+                        "size": st.st_size if stat.S_ISREG(st.st_mode) else 0
+                    })
             else:
-                search_pattern = os.path.join(dir_path, pattern)
-                files = glob.glob(search_pattern)
-            
-            file_list = []
-            for f in files:
-                file_list.append({
-                    "path": f,
-                    "name": os.path.basename(f),
-                    "is_dir": os.path.isdir(f),
-                    "size": os.path.getsize(f) if os.path.isfile(f) else 0
-                })
+                # DirEntry 自带文件类型，只有文件大小需要 stat
+                file_list = [{
+                    "path": entry.path,
+                    "name": entry.name,
+                    "is_dir": entry.is_dir(),
+                    "size": entry.stat().st_size if entry.is_file() else 0
+                } for entry in _scan_dir(dir_path, pattern, recursive)]
             
             return {
                 "success": True,
@@ -1015,7 +1476,7 @@ class MCPServer:
         
         try:
             cmd = [program_path] + list(arguments)
-            logger.info(f"运行程序: {' '.join(cmd)}")
+            logger.info("运行程序: %s", " ".join(cmd))
             
             if wait:
                 result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
@@ -1046,17 +1507,8 @@ class MCPServer:
         working_dir = os.path.expanduser(working_dir)
         
         # 安全检查 - 禁止危险命令
-        dangerous_patterns = [
-            'rm -rf /', 'rm -rf ~', 'rm -rf *',
-            'format', 'mkfs',
-            'dd if=/dev/zero',
-            'del /s /q c:\\',
-            ':(){ :|:& };:'  # fork bomb
-        ]
-        
-        for pattern in dangerous_patterns:
-            if pattern in command.lower():
-                return {"success": False, "error": "安全限制: 不允许执行此命令"}
+        if _DANGEROUS_COMMAND_RE.search(command):
+            return {"success": False, "error": "安全限制: 不允许执行此命令"}
         
         try:
             result = subprocess.run(
@@ -1082,16 +1534,9 @@ class MCPServer:
     
     def _handle_system_info(self, params: Dict) -> Dict:
         """获取系统信息"""
-        import platform
-        
         return {
             "success": True,
-            "system": platform.system(),
-            "release": platform.release(),
-            "version": platform.version(),
-            "machine": platform.machine(),
-            "processor": platform.processor(),
-            "python_version": platform.python_version(),
+            **_platform_info(),
             "current_dir": os.getcwd(),
             "home_dir": os.path.expanduser("~")
         }
@@ -1190,36 +1635,58 @@ class MCPServer:
     def start(self, host: str = "localhost", port: int = 8765):
         """启动 MCP 服务器（网络模式）"""
         
+        async def respond(data: bytes):
+            """处理一行请求，返回编码后的响应（无法解析时返回 None）"""
+            try:
+                request_data = json_utils.loads(data)
+            except json_utils.JSONDecodeError as e:
+                logger.error(f"JSON 解析错误: {e}")
+                return None
+            
+            # tools/list 直接拼接预先编码好的结果
+            if request_data.get("method") == "tools/list":
+                return self.tools_list_response(request_data.get("id", ""))
+            
+            request = MCPRequest(
+                id=request_data.get("id", ""),
+                method=request_data.get("method", ""),
+                params=request_data.get("params", {})
+            )
+            
+            response = await self.handle_request(request)
+            return json_utils.dumps_bytes(
+                {"id": response.id, "result": response.result, "error": response.error},
+                default=str
+            ) + b"\n"
+        
         async def handle_client(reader, writer):
             addr = writer.get_extra_info('peername')
             logger.info(f"客户端连接: {addr}")
             
             try:
+                # 客户端可能连续发送多个请求，一次读取一块数据后逐行处理，
+                # 每个响应处理完立即写出，整块处理完后才等待一次 drain
+                pending = []  # 还没有遇到换行符的数据块（大请求会跨越多个数据块）
                 while True:
-                    data = await reader.readline()
-                    if not data:
-                        break
+                    chunk = await reader.read(65536)
+                    pending.append(chunk)
+                    if chunk and b"\n" not in chunk:
+                        continue
                     
-                    try:
-                        request_data = json.loads(data.decode())
-                        request = MCPRequest(
-                            id=request_data.get("id", ""),
-                            method=request_data.get("method", ""),
-                            params=request_data.get("params", {})
-                        )
-                        
-                        response = await self.handle_request(request)
-                        response_data = {
-                            "id": response.id,
-                            "result": response.result,
-                            "error": response.error
-                        }
-                        
-                        writer.write((json.dumps(response_data) + "\n").encode())
-                        await writer.drain()
-                        
-                    except json.JSONDecodeError as e:
-                        logger.error(f"JSON 解析错误: {e}")
+                    lines = b"".join(pending).split(b"\n")
+                    # 最后一段是不完整的行，留到下次；连接关闭时最后一行可能没有换行符，一并处理
+                    pending = [lines.pop()] if chunk else []
+                    
+                    for line in lines:
+                        if not line.strip():
+                            continue
+                        data = await respond(line)
+                        if data is not None:
+                            writer.write(data)
+                    await writer.drain()
+                    
+                    if not chunk:
+                        break
                         
             except Exception as e:
                 logger.error(f"客户端处理错误: {e}")
@@ -1247,8 +1714,12 @@ class MCPServer:
             async with server:
                 await server.serve_forever()
         
+        from src.utils.event_loop import new_event_loop
+        loop = new_event_loop()
         try:
-            asyncio.run(main())
+            loop.run_until_complete(main())
         except KeyboardInterrupt:
             logger.info("服务器停止")
             print("\n服务器已停止")
+        finally:
+            loop.close()
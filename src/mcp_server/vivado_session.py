@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Vivado Session - 常驻的 Vivado TCL 进程
+每次以 batch 模式启动 Vivado 都要重新加载许可证、TCL 解释器和器件数据库（数秒到数十秒），
+常驻一个 tcl 模式的进程后，后续脚本通过标准输入提交，省去启动开销
+
+每个脚本写入临时文件，在常驻进程中以 catch { source } 执行：
+出错时与 batch 模式一样停在第一个错误处，并关闭可能仍打开的项目，不影响下一个脚本；
+脚本执行完毕后输出结束标记和返回码，读到结束标记即表示本次执行结束
+
+指定 project 时，项目在脚本执行后保持打开，下一个操作同一项目的脚本不必重新打开
+（打开大型项目同样需要数秒）；切换到其他项目时才关闭
+
+用法:
+    session = VivadoSession(vivado_path, temp_dir)
+    return_code, output = session.run(tcl_script, timeout=3600, project=xpr_path)
+    session.close()
+"""
+
+from typing import Optional, Tuple
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VivadoSession:
+    """常驻 Vivado 进程（线程安全，同一时间只执行一个脚本）"""
+    
+    # 脚本结束标记，后面紧跟 catch 的返回码
+    SENTINEL = "::ARIXA_DONE::"
+    
+    # 每个脚本结束后关闭 open_run 等打开的设计（batch 模式中随进程退出而丢弃），
+    # 只保留项目本身，之后的 launch_runs、报告、比特流不会用到已过期的内存中设计
+    CLOSE_DESIGNS = "foreach ::arixa_design [get_designs -quiet] { catch {current_design $::arixa_design; close_design} }"
+    
+    def __init__(self, vivado_path: str, temp_dir: str):
+        self.vivado_path = vivado_path
+        self.temp_dir = temp_dir
+        self._proc: Optional[subprocess.Popen] = None
+        self._lines: Optional[queue.Queue] = None  # 输出行（进程退出时放入 None）
+        self._project: Optional[str] = None  # 常驻进程中保持打开的项目
+        self._lock = threading.Lock()
+    
+    def run(self, tcl_script: str, timeout: float, project: Optional[str] = None) -> Tuple[int, str]:
+        """
+        在常驻进程中执行 TCL 脚本
+        
+        Args:
+            tcl_script: TCL 脚本（不应包含 exit）
+            timeout: 超时时间（秒），超时后结束进程，下次调用时重新启动
+            project: 脚本操作的项目（.xpr 路径），执行前确保已打开，执行后保持打开；
+                     为 None 时先关闭保持打开的项目
+        
+        Returns:
+            (返回码, 输出)，返回码 0 表示成功
+        
+        Raises:
+            subprocess.TimeoutExpired: 执行超时
+            RuntimeError: Vivado 进程意外退出
+        """
+        with self._lock:
+            self._ensure_started()
+            tcl_script = self._project_prefix(project) + tcl_script
+            
+            fd, tcl_file = tempfile.mkstemp(suffix=".tcl", prefix="arixa_", dir=self.temp_dir)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(tcl_script)
+                
+                path = tcl_file.replace("\\", "/")
+                self._proc.stdin.write(
+                    f"set ::arixa_rc [catch {{source -notrace {{{path}}}}} ::arixa_msg]\n"
+                    f"if {{$::arixa_rc}} {{ puts $::arixa_msg; catch {{close_project}} }}\n"
+                    f"{self.CLOSE_DESIGNS}\n"
+                    f"puts \"{self.SENTINEL}$::arixa_rc\"\n"
+                )
+                self._proc.stdin.flush()
+                
+                return_code, output = self._read_until_sentinel(timeout)
+                # 出错时项目已被关闭
+                self._project = project if return_code == 0 else None
+                return return_code, output
+            finally:
+                os.remove(tcl_file)
+    
+    def _project_prefix(self, project: Optional[str]) -> str:
+        """切换到 project 所需的 TCL 命令"""
+        prefix = ""
+        if self._project and self._project != project:
+            prefix += "catch {close_project}\n"
+        if project:
+            path = project.replace("\\", "/")
+            # 脚本自己关闭了项目时，保存的状态不再准确，以 Vivado 实际打开的项目为准
+            prefix += f'if {{[current_project -quiet] eq ""}} {{ open_project "{path}" }}\n'
+        return prefix
+    
+    def close(self):
+        """结束常驻进程"""
+        with self._lock:
+            self._stop()
+    
+    def _ensure_started(self):
+        """进程未启动或已退出时启动新进程"""
+        if self._proc is not None and self._proc.poll() is None:
+            return
+        
+        logger.info("启动常驻 Vivado 进程")
+        self._project = None
+        self._proc = subprocess.Popen(
+            [self.vivado_path, "-mode", "tcl", "-nojournal", "-nolog"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,  # 合并到标准输出，避免另一个管道写满后阻塞
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            bufsize=1,
+            cwd=self.temp_dir
+        )
+        
+        # 管道读取没有跨平台的超时，由后台线程逐行读取，主线程按超时等待队列
+        self._lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(self._proc.stdout, self._lines), daemon=True).start()
+    
+    @staticmethod
+    def _pump(stream, lines: queue.Queue):
+        for line in stream:
+            lines.put(line)
+        lines.put(None)
+    
+    def _read_until_sentinel(self, timeout: float) -> Tuple[int, str]:
+        """读取输出直到结束标记"""
+        deadline = time.monotonic() + timeout
+        output = []
+        
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                line = self._lines.get(timeout=max(0.0, remaining))
+            except queue.Empty:
+                self._stop(graceful=False)
+                raise subprocess.TimeoutExpired(self.vivado_path, timeout, "".join(output))
+            
+            if line is None:
+                self._stop(graceful=False)
+                raise RuntimeError("Vivado 进程意外退出:\n" + "".join(output[-20:]))
+            
+            # 回显的命令本身也含有结束标记（后面是 $::arixa_rc），只有后面紧跟数字才是真正的结束
+            index = line.find(self.SENTINEL)
+            if index >= 0:
+                code = line[index + len(self.SENTINEL):].strip()
+                if code.isdigit():
+                    output.append(line[:index])
+                    return int(code), "".join(output)
+            
+            output.append(line)
+    
+    def _stop(self, graceful: bool = True):
+        """结束进程：graceful 时先发送 exit 等待退出，否则直接结束"""
+        if self._proc is None:
+            return
+        
+        try:
+            if not graceful:
+                self._proc.kill()
+            elif self._proc.poll() is None:
+                self._proc.stdin.write("exit\n")
+                self._proc.stdin.flush()
+                self._proc.wait(timeout=10)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self._proc.kill()
+        finally:
+            self._proc = None
+            self._lines = None
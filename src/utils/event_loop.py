@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Event Loop - 创建 asyncio 事件循环
+安装了 uvloop 时使用 uvloop（基于 libuv，事件调度开销更低），否则使用标准库的事件循环
+
+只创建新的事件循环，不修改全局的事件循环策略，
+同一进程中的其他代码（如 GUI 线程）不受影响
+
+用法:
+    loop = new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+"""
+
+import asyncio
+
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    """创建新的事件循环"""
+    try:
+        import uvloop
+        return uvloop.new_event_loop()
+    except ImportError:
+        return asyncio.new_event_loop()
@@ -19,7 +19,6 @@ AI 中介的核心模块：将 AI 的指令转换为本地命令执行
 import subprocess
 import os
 import sys
-import json
 import shlex
 import tempfile
 import shutil
@@ -29,6 +28,8 @@ from enum import Enum
 import logging
 import re
 
+from src.utils import json_utils
+
 logger = logging.getLogger(__name__)
 
 
@@ -83,6 +84,9 @@ class CommandExecutor:
         r'>\s*/dev/sd',
     ]
     
+    # 预先编译（不区分大小写），检查时不必每次查找正则缓存、转换大小写
+    _DANGEROUS_REGEXES = [(pattern, re.compile(pattern, re.IGNORECASE)) for pattern in DANGEROUS_COMMANDS]
+    
     def __init__(self, config):
         """
         初始化执行器
@@ -99,6 +103,15 @@ class CommandExecutor:
             config.get("temp_dir", "~/.arixa/temp")
         )
         
+        # 操作类型 → 处理方法（execute_from_ai_response 按 action 分派）
+        self._action_handlers = {
+            "tool_call": self._handle_tool_call,
+            "shell": self._handle_shell,
+            "program": self._handle_program,
+            "tcl": self._handle_tcl,
+            "python": self._handle_python,
+        }
+        
         # 加载已注册的程序
         self._load_registered_programs()
         
@@ -130,10 +143,8 @@ class CommandExecutor:
         Returns:
             (是否安全, 原因)
         """
-        command_lower = command.lower()
-        
-        for pattern in self.DANGEROUS_COMMANDS:
-            if re.search(pattern, command_lower):
+        for pattern, regex in self._DANGEROUS_REGEXES:
+            if regex.search(command):
                 return False, f"命令匹配危险模式: {pattern}"
         
         return True, ""
@@ -417,41 +428,44 @@ class CommandExecutor:
         """
         action = ai_response.get("action", "")
         
-        if action == "tool_call":
-            # MCP 工具调用（由 MCP Server 处理）
-            return ExecutionResult(
-                success=True,
-                output="",
-                data={"type": "mcp_tool", "tool": ai_response.get("tool")}
-            )
-        
-        elif action == "shell":
-            command = ai_response.get("command", "")
-            working_dir = ai_response.get("working_dir")
-            return self.execute_shell(command, working_dir)
-        
-        elif action == "program":
-            program = ai_response.get("program", "")
-            args = ai_response.get("arguments", [])
-            wait = ai_response.get("wait", True)
-            return self.execute_program(program, args, wait=wait)
-        
-        elif action == "tcl":
-            commands = ai_response.get("commands", [])
-            if isinstance(commands, str):
-                commands = [commands]
-            return self.execute_vivado_tcl(commands)
-        
-        elif action == "python":
-            code = ai_response.get("code", "")
-            return self.execute_python(code)
-        
-        else:
+        handler = self._action_handlers.get(action)
+        if handler is None:
             return ExecutionResult(
                 success=False,
                 output="",
                 error=f"未知的操作类型: {action}"
             )
+        
+        return handler(ai_response)
+    
+    def _handle_tool_call(self, ai_response: Dict) -> ExecutionResult:
+        """MCP 工具调用（由 MCP Server 处理）"""
+        return ExecutionResult(
+            success=True,
+            output="",
+            data={"type": "mcp_tool", "tool": ai_response.get("tool")}
+        )
+    
+    def _handle_shell(self, ai_response: Dict) -> ExecutionResult:
+        command = ai_response.get("command", "")
+        working_dir = ai_response.get("working_dir")
+        return self.execute_shell(command, working_dir)
+    
+    def _handle_program(self, ai_response: Dict) -> ExecutionResult:
+        program = ai_response.get("program", "")
+        args = ai_response.get("arguments", [])
+        wait = ai_response.get("wait", True)
+        return self.execute_program(program, args, wait=wait)
+    
+    def _handle_tcl(self, ai_response: Dict) -> ExecutionResult:
+        commands = ai_response.get("commands", [])
+        if isinstance(commands, str):
+            commands = [commands]
+        return self.execute_vivado_tcl(commands)
+    
+    def _handle_python(self, ai_response: Dict) -> ExecutionResult:
+        code = ai_response.get("code", "")
+        return self.execute_python(code)
     
     def get_registered_programs(self) -> Dict[str, Dict]:
         """获取所有已注册程序的信息"""
@@ -513,12 +527,12 @@ class AICommandParser:
         
         for match in matches:
             try:
-                data = json.loads(match)
+                data = json_utils.loads(match)
                 if isinstance(data, dict):
                     commands.append(data)
                 elif isinstance(data, list):
                     commands.extend(data)
-            except json.JSONDecodeError:
+            except json_utils.JSONDecodeError:
                 pass
         
         # 2. 查找内联 JSON（以 { 开始，以 } 结束的行）
@@ -528,9 +542,9 @@ class AICommandParser:
                 line = line.strip()
                 if line.startswith('{') and line.endswith('}'):
                     try:
-                        data = json.loads(line)
+                        data = json_utils.loads(line)
                         commands.append(data)
-                    except json.JSONDecodeError:
+                    except json_utils.JSONDecodeError:
                         pass
         
         # 3. 查找特殊标记
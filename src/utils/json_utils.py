@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+JSON Utils - JSON 编解码
+安装了 orjson 时使用 orjson（比标准库 json 快数倍），否则回退到标准库
+
+用法:
+    data = loads(response.content)      # 接受 str 或 bytes
+    body = dumps_bytes(payload)         # 直接作为 HTTP 请求体
+    text = dumps(value, sort_keys=True)
+
+解析失败时抛出 JSONDecodeError（orjson.JSONDecodeError 是 json.JSONDecodeError 的子类），
+调用方捕获 json_utils.JSONDecodeError 即可，无需再导入标准库 json。
+"""
+
+from typing import Any, Callable, Optional, Union
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """解析 JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj: Any, sort_keys: bool = False, default: Optional[Callable] = None) -> bytes:
+    """序列化为 UTF-8 编码的 JSON 字节串"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(obj, sort_keys=sort_keys, default=default, ensure_ascii=False).encode("utf-8")
+
+
+def dumps(obj: Any, sort_keys: bool = False, default: Optional[Callable] = None) -> str:
+    """序列化为 JSON 字符串"""
+    if orjson is not None:
+        return dumps_bytes(obj, sort_keys, default).decode("utf-8")
+    return json.dumps(obj, sort_keys=sort_keys, default=default, ensure_ascii=False)